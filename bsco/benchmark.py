@@ -0,0 +1,323 @@
+# ==========================================================================================================
+# Name :    benchmark
+# Goal :    Reproducible timings of the bsco and crmm pipelines on synthetic data
+# History:
+# 18/oct/2026    ERK Created
+# ==========================================================================================================
+import sys, getopt, os.path
+import util, json, io
+import contextlib
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+# ============================= LOCAL VARIABLES ====================================
+errHandle = util.ErrHandle()
+# All benchmarks, in the order they are run
+lBenchmarks = ["bsco_compact", "bsco_full", "add_list", "crmm_index", "crmm_index_stream", "crmm_download", "crmminfo_memory", "import_time"]
+# Values that the synthetic columns are made of: repeats are common in real exports
+lWords = ["Amsterdam", "Leiden", "Utrecht", "Den Haag", "Haarlem", "Middelburg", "Zwolle",
+          "bookseller", "auction", "catalogue", "octavo", "quarto", "folio"]
+
+
+def make_value(rnd):
+    """Return one synthetic BSCO cell: the same mix of types as a real export"""
+
+    r = rnd.random()
+    if r < 0.15:
+        return None
+    elif r < 0.45:
+        return rnd.choice(lWords)
+    elif r < 0.65:
+        return [rnd.choice(lWords)]
+    elif r < 0.75:
+        return [rnd.choice(lWords), rnd.choice(lWords)]
+    elif r < 0.85:
+        return rnd.randint(1600, 1800)
+    elif r < 0.9:
+        return "=" + rnd.choice(lWords)
+    else:
+        return " ".join(rnd.choice(lWords) for i in range(rnd.randint(3, 12)))
+
+def make_bsco(flOutput, iRows, iSeed=1):
+    """Write a BSCO-shaped JSON file with [iRows] rows for every column of lStructure"""
+
+    from columns import lStructure
+
+    rnd = random.Random(iSeed)
+    oOutput = {}
+    for sheetobject in lStructure:
+        sheetName = sheetobject['name']
+        if len(sheetobject['header']) == 0:
+            oOutput[sheetName] = [make_value(rnd) for i in range(iRows)]
+        else:
+            oOutput[sheetName] = {}
+            for colName in sheetobject['header']:
+                oOutput[sheetName][colName] = [make_value(rnd) for i in range(iRows)]
+    with io.open(flOutput, "w", encoding="utf-8") as f:
+        json.dump(oOutput, f)
+    return flOutput
+
+def make_crmm_index(flOutput, iRows, sBaseUrl="http://127.0.0.1:8000"):
+    """Write a CRMM index workbook with [iRows] rows and hyperlinked PSD and meta cells"""
+
+    import openpyxl
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["Nr", "File", "MRG", "Meta", "Wijk", "Groningen", "Havelte"])
+    for idx in range(1, iRows + 1):
+        row = idx + 1
+        ws.append([idx, 1000 + idx, "crmm_{}.mrg".format(1000 + idx), "meta",
+                   1 if idx % 3 == 0 else "", 1 if idx % 3 == 1 else "", "1"])
+        ws.cell(row=row, column=3).hyperlink = "{}/psd/{}".format(sBaseUrl, 1000 + idx)
+        ws.cell(row=row, column=4).hyperlink = "{}/meta/{}".format(sBaseUrl, 1000 + idx)
+    wb.save(flOutput)
+    return flOutput
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serve synthetic PSD and meta.xml texts after a fixed latency"""
+
+    latency = 0.0
+    size = 20000
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        sName = self.path.rsplit("/", 1)[-1]
+        if self.path.startswith("/meta/"):
+            sText = '<?xml version="1.0" encoding="utf-8"?><meta><id>{}</id></meta>'.format(sName)
+        else:
+            sLine = "( (IP-MAT (NP-SBJ (N Jan)) (VBD sprak)) (ID crmm_{}))\n".format(sName)
+            sText = sLine * max(1, self.size // len(sLine))
+        sEtag = '"{}-{}"'.format(sName, len(sText))
+        if self.headers.get("If-None-Match") == sEtag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        bData = sText.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(bData)))
+        self.send_header("ETag", sEtag)
+        self.end_headers()
+        self.wfile.write(bData)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+def start_server(fLatency=0.0, iSize=20000):
+    """Start a local stand-in server on a free port: return (server, base url)"""
+
+    handler = type("Handler", (StandInHandler,), {'latency': fLatency, 'size': iSize})
+    server = StandInServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, "http://127.0.0.1:{}".format(server.server_address[1])
+
+def best_of(fn, iRepeat):
+    """Run [fn] [iRepeat] times with status output suppressed: return the best and all times"""
+
+    lTimes = []
+    for idx in range(iRepeat):
+        with contextlib.redirect_stderr(io.StringIO()):
+            fStart = time.perf_counter()
+            fn()
+            lTimes.append(time.perf_counter() - fStart)
+    return {'best': round(min(lTimes), 6), 'times': [round(t, 6) for t in lTimes]}
+
+def get_commit():
+    """Return the current git commit, if there is one"""
+
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except:
+        return None
+
+# ----------------------------------------------------------------------------------
+# Name :    run_benchmarks
+# Goal :    Run the benchmarks in [lRun] and return their results
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def run_benchmarks(lRun, iRows=2000, iRepeat=3, fLatency=0.01, iWorkers=8, iFiles=50):
+    # The import times are measured in a new interpreter, see get_import_times()
+    import bsco, crmm, openpyxl
+
+    oResult = {'commit': get_commit(),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'params': {'rows': iRows, 'repeat': iRepeat, 'latency': fLatency,
+                          'workers': iWorkers, 'files': iFiles},
+               'results': {}}
+    dirTemp = tempfile.mkdtemp(prefix="bsco_bench_")
+    try:
+        flJson = None
+        if "bsco_compact" in lRun or "bsco_full" in lRun or "add_list" in lRun:
+            flJson = make_bsco(os.path.join(dirTemp, "bsco.json"), iRows)
+        for sMethod in ("compact", "full"):
+            if "bsco_" + sMethod in lRun:
+                oArgs = {'input': flJson, 'output': os.path.join(dirTemp, "out"), 'method': sMethod}
+                errHandle.Status("Benchmark bsco_" + sMethod)
+                oResult['results']["bsco_" + sMethod] = best_of(lambda: bsco.process_bsco(dict(oArgs)), iRepeat)
+        if "add_list" in lRun:
+            with io.open(flJson, "r", encoding="utf-8") as f:
+                oInput = json.load(f)
+            lColumn = oInput["Catalogue"]["Location"]
+            def add_list():
+                wb = openpyxl.Workbook()
+                bsco.add_list(wb.active, lColumn, 1)
+            errHandle.Status("Benchmark add_list")
+            oTimes = best_of(add_list, iRepeat)
+            oTimes['cells_per_second'] = int(len(lColumn) / oTimes['best'])
+            oResult['results']["add_list"] = oTimes
+        if "crmm_index" in lRun:
+            flIndex = make_crmm_index(os.path.join(dirTemp, "index.xlsx"), iRows)
+            def crmm_index():
+                ws = openpyxl.load_workbook(filename=flIndex).active
+                return len(list(crmm.read_index(ws)))
+            errHandle.Status("Benchmark crmm_index")
+            oResult['results']["crmm_index"] = best_of(crmm_index, iRepeat)
+        if "crmm_index_stream" in lRun:
+            flIndex = os.path.join(dirTemp, "index.xlsx")
+            if not os.path.exists(flIndex):
+                make_crmm_index(flIndex, iRows)
+            errHandle.Status("Benchmark crmm_index_stream")
+            oResult['results']["crmm_index_stream"] = best_of(lambda: len(list(crmm.read_index_lean(flIndex))), iRepeat)
+        if "crmm_download" in lRun:
+            server, sBaseUrl = start_server(fLatency)
+            try:
+                flIndex = make_crmm_index(os.path.join(dirTemp, "download.xlsx"), iFiles, sBaseUrl)
+                info_list = list(crmm.read_index(openpyxl.load_workbook(filename=flIndex).active))
+                dirOutput = os.path.join(dirTemp, "mrg")
+                def crmm_download():
+                    # Start from an empty directory each time
+                    shutil.rmtree(dirOutput, ignore_errors=True)
+                    os.makedirs(dirOutput)
+                    crmm.download_info(info_list, dirOutput, iWorkers)
+                errHandle.Status("Benchmark crmm_download")
+                oResult['results']["crmm_download"] = best_of(crmm_download, iRepeat)
+            finally:
+                server.shutdown()
+        if "crmminfo_memory" in lRun:
+            from models import CrmmInfo
+            errHandle.Status("Benchmark crmminfo_memory")
+            tracemalloc.start()
+            lInfo = [CrmmInfo(line=idx + 2, filenum=1000 + idx, mrg_name="crmm_{}.mrg".format(idx),
+                              mrg_url="http://x/psd/{}".format(idx), meta_url="http://x/meta/{}".format(idx),
+                              location="xDF575regioDeWijk") for idx in range(100000)]
+            iCurrent, iPeak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            oResult['results']["crmminfo_memory"] = {'records': len(lInfo), 'bytes': iCurrent,
+                                                     'bytes_per_record': iCurrent // len(lInfo)}
+        if "import_time" in lRun:
+            errHandle.Status("Benchmark import_time")
+            oResult['results']["import_time"] = get_import_times(iRepeat)
+    finally:
+        shutil.rmtree(dirTemp, ignore_errors=True)
+    return oResult
+
+def get_import_times(iRepeat):
+    """Time the start of a new interpreter for the common commands: the best of [iRepeat] runs"""
+
+    dirHere = os.path.dirname(os.path.abspath(__file__))
+    lStart = [("python", ["-c", "pass"]),
+              ("import_bsco", ["-c", "import bsco"]),
+              ("import_crmm", ["-c", "import crmm"])]
+    if os.path.exists(os.path.join(dirHere, "cli.py")):
+        for sCommand in ("bsco convert", "crmm fetch", "crmm index"):
+            lStart.append(("cli " + sCommand, ["cli.py"] + sCommand.split() + ["-h"]))
+    oTimes = {}
+    for sName, lArgs in lStart:
+        lTimes = []
+        for idx in range(iRepeat):
+            fStart = time.perf_counter()
+            subprocess.call([sys.executable] + lArgs, cwd=dirHere, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            lTimes.append(time.perf_counter() - fStart)
+        oTimes[sName] = round(min(lTimes), 6)
+    return oTimes
+
+# ----------------------------------------------------------------------------------
+# Name :    main
+# Goal :    Main body of the function
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def main(prgName, argv) :
+  flOutput = ''       # JSON file with the results
+  iRows = 2000        # Rows of the synthetic BSCO export and CRMM index
+  iRepeat = 3         # Number of runs of each benchmark
+  fLatency = 0.01     # Latency of the stand-in server in seconds
+  iWorkers = 8        # Parallel downloads
+  iFiles = 50         # Records of the download benchmark
+  lRun = lBenchmarks  # Benchmarks to run
+
+  try:
+    # Adapt the program name to exclude the directory
+    index = prgName.rfind("\\")
+    if (index > 0) :
+      prgName = prgName[index+1:]
+    sSyntax = prgName + ' [-n <rows>] [-r <repeat>] [-l <latency ms>] [-w <workers>] [-f <files>] [-b <benchmark,...>] [-o <results.json>]'
+    # get all the arguments
+    try:
+      # Get arguments and options
+      opts, args = getopt.getopt(argv, "hn:r:l:w:f:b:o:", ["rows=","repeat=","latency=","workers=","files=","benchmarks=","output="])
+    except getopt.GetoptError:
+      print(sSyntax)
+      sys.exit(2)
+    # Walk all the arguments
+    for opt, arg in opts:
+      if opt in ("-h", "--help"):
+        print(sSyntax)
+        print("Benchmarks: " + ", ".join(lBenchmarks))
+        sys.exit(0)
+      elif opt in ("-n", "--rows"):
+        iRows = int(arg)
+      elif opt in ("-r", "--repeat"):
+        iRepeat = int(arg)
+      elif opt in ("-l", "--latency"):
+        fLatency = float(arg) / 1000
+      elif opt in ("-w", "--workers"):
+        iWorkers = int(arg)
+      elif opt in ("-f", "--files"):
+        iFiles = int(arg)
+      elif opt in ("-b", "--benchmarks"):
+        lRun = arg.split(",")
+      elif opt in ("-o", "--output"):
+        flOutput = arg
+    for sName in lRun:
+      if sName not in lBenchmarks:
+        errHandle.DoError("Unknown benchmark: " + sName)
+        return False
+    oResult = run_benchmarks(lRun, iRows, iRepeat, fLatency, iWorkers, iFiles)
+    sResult = json.dumps(oResult, indent=2)
+    if flOutput == '':
+      print(sResult)
+    else:
+      with io.open(flOutput, "w", encoding="utf-8") as f:
+        f.write(sResult)
+      errHandle.Status('Results are in "' + flOutput + '"')
+    return True
+  except:
+    # act
+    errHandle.DoError("main")
+    return False
+
+# ----------------------------------------------------------------------------------
+# Goal :  If user calls this as main, then follow up on it
+# ----------------------------------------------------------------------------------
+if __name__ == "__main__":
+  # Call the main function with two arguments: program name + remainder
+  main(sys.argv[0], sys.argv[1:])
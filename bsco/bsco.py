@@ -5,24 +5,19 @@
 # 16/feb/2017    ERK Created
 # ==========================================================================================================
 import sys, getopt, os.path, importlib
+import glob, time
 import util, json, io
-import openpyxl
-from openpyxl.utils.cell import get_column_letter
-from openpyxl import Workbook
+import jsonstream
+import shutil, tempfile
+import xlsxparts
+import outputs
+from cache import InputCache
+from columns import lStructure, get_sheet, get_layout, get_rows, count_rows, normalize_column, normalize_input
+from copy import copy
+# openpyxl and concurrent.futures are slow to load: they are imported by the functions that need them
 
 # ============================= LOCAL VARIABLES ====================================
 errHandle = util.ErrHandle()
-lStructure = [
-        {"name": "Documents", "header": []},
-        {"name": "Bookseller", "header": ["Name"]},
-        {"name": "Catalogue", "header": ["Annotation", "Pages (original)", "Scanned", "Type",
-                                     "Literature", "Pages", "Collation", "Manuscript notes",
-                                     "Scanned copy", "Location", "Title", "Location (original)",
-                                     "Title page transcription"]},
-        {"name": "Citation", "header": ["Title", "URL", "ID", "Type"]},
-        {"name": "Owner", "header": ["Profession", "Location", "Name"]},
-        {"name": "Auction", "header": ["Venue", "Year", "Location", "Date"]}
-        ]
 
 # ----------------------------------------------------------------------------------
 # Name :    main
@@ -36,17 +31,29 @@ def main(prgName, argv) :
   sMethod = 'compact' # Output method: "compact", "full"
                       #   compact = all on one worksheet
                       #   full    = use separate worksheets
+                      # or several at once, e.g. "compact,full"
+  sEngine = 'cell'    # Output engine: "cell", "stream"
+                      #   cell    = build the workbook in memory cell by cell
+                      #   stream  = write-only workbook, written row by row
+  sReader = 'load'    # Input reader: "load", "stream"
+                      #   load    = parse the whole JSON input at once
+                      #   stream  = parse one column list at a time
+  bPlain = False      # Leave data cells in the default style
+  iJobs = 1           # Number of processes: for the sheets of "full", or for the files of a batch
+  sFormat = 'xlsx'    # Output format: "xlsx", "csv", "sqlite", "parquet"
+  dirCache = ''       # Directory that caches parsed input
+  flProfile = ''      # JSON file for the timing and memory report
 
   try:
     # Adapt the program name to exclude the directory
     index = prgName.rfind("\\")
     if (index > 0) :
       prgName = prgName[index+1:]
-    sSyntax = prgName + ' [-m <method>] -i <input directory> -o <output directory>'
+    sSyntax = prgName + ' [-m <method>[,<method>]] [-e <engine>] [-r <reader>] [-p] [-j <jobs>] [-f <format>] [-c <cache directory>] [--profile <report.json>] -i <input file, directory or glob> -o <output file or directory>'
     # get all the arguments
     try:
       # Get arguments and options
-      opts, args = getopt.getopt(argv, "hm:i:o:", ["-method=","-inputdir=","-outputdir="])
+      opts, args = getopt.getopt(argv, "hpm:e:r:j:f:c:i:o:", ["plain","jobs=","format=","cache=","-method=","engine=","reader=","-inputdir=","-outputdir=","profile="])
     except getopt.GetoptError:
       print(sSyntax)
       sys.exit(2)
@@ -55,8 +62,22 @@ def main(prgName, argv) :
       if opt in ("-h", "--help"):
         print(sSyntax)
         sys.exit(0)
+      elif opt in ("-p", "--plain"):
+        bPlain = True
+      elif opt in ("-c", "--cache"):
+        dirCache = arg
+      elif opt == "--profile":
+        flProfile = arg
+      elif opt in ("-f", "--format"):
+        sFormat = arg
+      elif opt in ("-j", "--jobs"):
+        iJobs = int(arg)
       elif opt in ("-m", "--method"):
         sMethod = arg
+      elif opt in ("-e", "--engine"):
+        sEngine = arg
+      elif opt in ("-r", "--reader"):
+        sReader = arg
       elif opt in ("-i", "--ifile"):
         flInput = arg
       elif opt in ("-o", "--ofile"):
@@ -68,11 +89,34 @@ def main(prgName, argv) :
     errHandle.Status('Input is "' + flInput + '"')
     errHandle.Status('Output is "' + flOutput + '"')
     errHandle.Status('Output method is "' + sMethod + '"')
+    errHandle.Status('Output engine is "' + sEngine + '"')
+    errHandle.Status('Input reader is "' + sReader + '"')
+    errHandle.Status('Plain data cells: {}'.format(bPlain))
+    errHandle.Status('Jobs: {}'.format(iJobs))
+    errHandle.Status('Output format is "' + sFormat + '"')
+    if dirCache != '': errHandle.Status('Cache is "' + dirCache + '"')
+    if flProfile != '':
+      errHandle.Status('Profile report is "' + flProfile + '"')
+      util.profiler.start_trace()
     # Call the function that does the job
     oArgs = {'input': flInput,
              'output': flOutput,
-             'method': sMethod}
-    if (process_bsco(oArgs)) :
+             'method': sMethod,
+             'engine': sEngine,
+             'reader': sReader,
+             'plain': bPlain,
+             'jobs': iJobs,
+             'format': sFormat,
+             'cache': dirCache}
+    if is_batch(flInput):
+      bOkay = process_batch(oArgs)
+    else:
+      bOkay = process_bsco(oArgs)
+      if bOkay: util.profiler.count("rows_written", oArgs.get('rows', 0))
+    if flProfile != '':
+      util.profiler.snapshot("end")
+      util.profiler.save(flProfile)
+    if (bOkay) :
       errHandle.Status("Ready")
     else :
       errHandle.DoError("Could not complete")
@@ -93,6 +137,14 @@ def process_bsco(oArgs):
     flInput = ""    # 
     flOutput = ""   # 
     sMethod = ""    # 
+    sEngine = "cell"# Output engine: "cell" or "stream"
+    sReader = "load"# Input reader: "load" or "stream"
+    bPlain = False  # Skip the styling of data cells
+    iJobs = 1       # Number of processes for the sheets of "full"
+    sFormat = "xlsx"# Output format: "xlsx" or one of outputs.OUTPUTS
+    dirCache = ""   # Directory of the parsed-input cache
+    oInput = None   # The (parsed) input
+    bNormal = False # The columns of oInput are normalized already
     arInput = []    # Array of input files
     arOutput = []   # Array of output files
     lOutput = []    # List of output objects (one per hit)
@@ -102,10 +154,29 @@ def process_bsco(oArgs):
         if "method" in oArgs: sMethod = oArgs["method"]
         if "input" in oArgs: flInput = oArgs["input"]
         if "output" in oArgs: flOutput = oArgs["output"]
+        if "engine" in oArgs: sEngine = oArgs["engine"]
+        if "reader" in oArgs: sReader = oArgs["reader"]
+        if "plain" in oArgs: bPlain = oArgs["plain"]
+        if "jobs" in oArgs: iJobs = oArgs["jobs"]
+        if "format" in oArgs: sFormat = oArgs["format"]
+        if "cache" in oArgs: dirCache = oArgs["cache"]
 
-        # Adapt the output file name
-        flOutput = flOutput.split(sep=".")[0]
-        flOutput = "{}_{}.xlsx".format(flOutput,sMethod)
+        # Adapt the output file name: each method adds its name to it
+        flRoot = flOutput.split(sep=".")[0]
+        lMethods = sMethod.split(",")
+
+        # Check the methods and the output format
+        oArgs['rows'] = 0
+        for sMethod in lMethods:
+            if sMethod not in ("compact", "full"):
+                errHandle.Status("Unknown method: " + sMethod)
+                return False
+        if sFormat != "xlsx" and sFormat not in outputs.OUTPUTS:
+            errHandle.Status("Unknown output format: " + sFormat)
+            return False
+        elif sFormat == "parquet" and not outputs.has_pyarrow():
+            errHandle.Status("The parquet output needs pyarrow")
+            return False
 
         # Check input file
         if not os.path.isfile(flInput):
@@ -113,24 +184,95 @@ def process_bsco(oArgs):
             return False
 
         # Double check the output
-        if os.path.exists(flOutput):
-            # Check if it accidentily is a directory
-            if os.path.isdir(flOutput):
-                errHandle.Status("Please specify an output FILE")
-                return False
+        for sMethod in lMethods:
+            flOutput = "{}_{}.xlsx".format(flRoot, sMethod)
+            if os.path.exists(flOutput):
+                # Check if it accidentily is a directory
+                if os.path.isdir(flOutput):
+                    errHandle.Status("Please specify an output FILE")
+                    return False
+                else:
+                    # give warning that we will overwrite
+                    errHandle.Status("We will overwrite the existing output file")
+
+        with util.profiler.stage("parse"):
+            if sReader == "stream":
+                # Only index the column lists: each column is parsed when it is written
+                oInput = jsonstream.JsonColumns(flInput, lStructure)
             else:
-                # give warning that we will overwrite
-                errHandle.Status("We will overwrite the existing output file")
+                oCache = None
+                if dirCache != "":
+                    # Try the normalized columns of an earlier run
+                    oCache = InputCache(dirCache)
+                    sKey = oCache.get_key(flInput)
+                    oInput = oCache.get(sKey)
+                    if oInput != None:
+                        errHandle.Status("Using cached input")
+                        bNormal = True
+                if oInput == None:
+                    # Open the input file for reading, and treat it as UTF8 encoded
+                    f = io.open(flInput, mode="r", encoding="UTF-8")
+                    # Read the input file as JSON
+                    oInput = json.load(f)
+                    # Close the input file again
+                    f.close()
+                    if oCache != None:
+                        oInput = normalize_input(oInput)
+                        bNormal = True
+                        oCache.put(sKey, oInput)
+        util.profiler.snapshot("parsed")
+        oArgs['rows'] = count_rows(oInput)
+
+        if len(lMethods) > 1 and sReader != "stream" and not bNormal:
+            # Normalize each column once, for all of the methods
+            with util.profiler.stage("normalize"):
+                oInput = normalize_input(oInput)
+
+        # Write the output of each method from the same input
+        for sMethod in lMethods:
+            flBase = "{}_{}".format(flRoot, sMethod)
+            if not write_method(oInput, sMethod, flBase, sFormat, sEngine, bPlain, iJobs):
+                return False
+
+        # We are happy: return okay
+        return True
+    except:
+        # act
+        errHandle.DoError("process_bsco")
+        return False
 
-        # Open the input file for reading, and treat it as UTF8 encoded
-        f = io.open(flInput, mode="r", encoding="UTF-8")
-        # Read the input file as JSON
-        oInput = json.load(f)
-        # Close the input file again
-        f.close()
+# ----------------------------------------------------------------------------------
+# Name :    write_method
+# Goal :    Write the (parsed) input [oInput] in the layout of [sMethod]
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def write_method(oInput, sMethod, flBase, sFormat="xlsx", sEngine="cell", bPlain=False, iJobs=1):
+    """Write [oInput] with method [sMethod] to the output file(s) starting with [flBase]"""
+
+    flOutput = "{}.xlsx".format(flBase)
+    try:
+        if sFormat != "xlsx":
+            # Write one of the columnar formats
+            return write_output(oInput, sMethod, flBase, sFormat)
+
+        if iJobs > 1:
+            if sMethod == "full":
+                # Make each sheet in its own process
+                errHandle.Status("Saving... "+flOutput)
+                return write_parallel(oInput, flOutput, bPlain, iJobs)
+            errHandle.Status("Only the full method can be divided over processes")
+
+        if sEngine == "stream":
+            # Write the workbook row by row in write-only mode
+            errHandle.Status("Saving... "+flOutput)
+            return write_stream(oInput, sMethod, flOutput, bPlain)
 
         # Create an excel file with the correct worksheets
+        fStart = time.perf_counter()
+        import openpyxl
         wbOutput = openpyxl.Workbook()
+        styles = StyleRegistry(wbOutput, bPlain)
 
         # Action depends on the method used
         if sMethod == "full":
@@ -145,7 +287,7 @@ def process_bsco(oArgs):
 
                 # Naming depends on whether this is the first sheet
                 if bFirst:
-                    sheet = wbOutput.get_active_sheet()
+                    sheet = wbOutput.active
                     sheet.title = sheetName
                     bFirst = False
                 else:
@@ -163,23 +305,23 @@ def process_bsco(oArgs):
                 # Check if there are columns
                 if len(lHeader) == 0:
                     # There are no columns, there is just a list
-                    add_header_row(sheet, ["no header"])
+                    add_header_row(sheet, ["no header"], styles)
                     lInput = oInput[sheetName]
-                    add_list(sheet, lInput, col_num)
+                    add_list(sheet, lInput, col_num, styles)
                 else:
                     # There are columns: add their names
-                    add_header_row(sheet, lHeader)
+                    add_header_row(sheet, lHeader, styles)
                     # Process all the columns
                     for colName in lHeader:
                         errHandle.Status("   column: " + colName)
                         # Get the list of information for this column
                         lInput = oInput[sheetName][colName]
                         # Add this list to the sheet
-                        add_list(sheet, lInput, col_num)
+                        add_list(sheet, lInput, col_num, styles)
                         col_num += 1
         elif sMethod == "compact":
             # Put the output on to one sheet
-            sheet = wbOutput.get_active_sheet()
+            sheet = wbOutput.active
             sheet.title = "Compact"
 
             # Set the column number: start with 1
@@ -197,41 +339,79 @@ def process_bsco(oArgs):
                 # Check if there is a separate header
                 if len(lHeader) == 0:
                     # There are no columns, there is just a list
-                    add_one_header(sheet, col_num, sheetName)
+                    add_one_header(sheet, col_num, sheetName, styles)
                     lInput = oInput[sheetName]
-                    add_list(sheet, lInput, col_num)
+                    add_list(sheet, lInput, col_num, styles)
                     col_num += 1
                 else:
                     # Process all the columns
                     for colName in lHeader:
                         errHandle.Status("   column: " + colName)
                         # Add a header for this column
-                        add_one_header(sheet, col_num, "{}.{}".format(sheetName, colName ))
+                        add_one_header(sheet, col_num, "{}.{}".format(sheetName, colName ), styles)
                         # Get the list of information for this column
                         lInput = oInput[sheetName][colName]
                         # Add this list to the sheet
-                        add_list(sheet, lInput, col_num)
+                        add_list(sheet, lInput, col_num, styles)
                         col_num += 1
 
-        
+        util.profiler.add_time("write_cells", time.perf_counter() - fStart)
+
         # Save the output file
         errHandle.Status("Saving... "+flOutput)
-        wbOutput.save(flOutput)
+        with util.profiler.stage("save"):
+            wbOutput.save(flOutput)
 
-        # We are happy: return okay
         return True
     except:
         # act
-        errHandle.DoError("process_bsco")
+        errHandle.DoError("write_method")
         return False
     
-def add_header_row(wsThis, lColNames):
+class StyleRegistry():
+    """The named styles of one workbook, built once and applied cheaply
+
+    The first cell that gets a named style fixes its style array; all later
+    cells get a copy of that array, without looking up or comparing styles.
+    """
+
+    def __init__(self, wbThis, bPlain=False):
+        from openpyxl.styles import Alignment, Font, NamedStyle
+
+        self.bPlain = bPlain    # Leave data cells in the default style
+        self.oStyleArray = {}
+        header = NamedStyle(name="bsco_header")
+        header.font = Font(bold=True)
+        cell = NamedStyle(name="bsco_cell")
+        cell.alignment = Alignment(wrap_text=False)
+        for style in (header, cell):
+            if style.name not in wbThis.named_styles:
+                wbThis.add_named_style(style)
+
+    def apply(self, c, sName):
+        """Give cell [c] the named style [sName]"""
+
+        aStyle = self.oStyleArray.get(sName)
+        if aStyle == None:
+            c.style = sName
+            self.oStyleArray[sName] = copy(c._style)
+        else:
+            c._style = copy(aStyle)
+
+    def header(self, c):
+        self.apply(c, "bsco_header")
+
+    def cell(self, c):
+        if not self.bPlain:
+            self.apply(c, "bsco_cell")
+
+def add_header_row(wsThis, lColNames, styles=None):
     """Add a header row using the names in [lColNames] to worksheet wsThis"""
 
     try:
         # Iterate through all the intended columns
         for col_num in range(len(lColNames)):
-            add_one_header(wsThis, col_num+1, lColNames[col_num])
+            add_one_header(wsThis, col_num+1, lColNames[col_num], styles)
         # Return okay
         return True
     except:
@@ -239,10 +419,13 @@ def add_header_row(wsThis, lColNames):
         errHandle.DoError("add_header_row")
         return False
 
-def add_one_header(wsThis, col_num, sName):
+def add_one_header(wsThis, col_num, sName, styles=None):
     """Add a header called [sName] to worksheet wsThis, column [col_num]"""
 
+    from openpyxl.utils.cell import get_column_letter
+
     try:
+        if styles == None: styles = StyleRegistry(wsThis.parent)
         row_num = 1
         # Iterate through all the intended columns
         # Get the correct cell
@@ -250,7 +433,7 @@ def add_one_header(wsThis, col_num, sName):
         # Set the value of this cell correctly
         c.value = sName
         # Set the font of this cell to bold
-        c.font = openpyxl.styles.Font(bold=True)
+        styles.header(c)
         # Set the width of this column to a standard value
         wsThis.column_dimensions[get_column_letter(col_num)].width = 20.0
         # Return okay
@@ -260,41 +443,22 @@ def add_one_header(wsThis, col_num, sName):
         errHandle.DoError("add_one_header")
         return False
 
-def add_list(wsThis, lThis, col_num):
+@util.profiler.timed()
+def add_list(wsThis, lThis, col_num, styles=None):
     """Add the list in [lThis] on worksheet [wsThis] to column [col_num]"""
 
     try:
-        # Walk all items in the list
+        if styles == None: styles = StyleRegistry(wsThis.parent)
+        # Walk all values of the list
         row_num = 0
-        for item in lThis:
+        for value in normalize_column(lThis):
             row_num += 1
             # Get the cell number it needs to be put into
             c = wsThis.cell(row=row_num + 1, column=col_num)
-            # Set the value for this cell: this depends on what this is
-            if item == None:
-                c.value = ""
-            elif type(item) is list:
-                # If the list is just one member...
-                if len(item) == 1:
-                    fItem = item[0]
-                    if fItem == None:
-                        c.value = ""
-                    elif type(fItem) is str and fItem.startswith("="):
-                        # Items that start with '=' are otherwise treated as formulas
-                        c.value = json.dumps(item)
-                    else:
-                        c.value = fItem
-                else:
-                    c.value = json.dumps(item)
-            elif type(item) is str and item.startswith("="):
-                # Items that start with '=' are otherwise treated as formulas
-                c.value = json.dumps(item)
-            elif type(item) is int or type(item) is str:
-                c.value = item
-            else:
-                c.value = json.dumps(item)
+            # Set the value for this cell
+            c.value = value
             # Set the alignment
-            c.alignment = openpyxl.styles.Alignment(wrap_text=False)
+            styles.cell(c)
 
         # Return okay
         return True
@@ -303,6 +467,224 @@ def add_list(wsThis, lThis, col_num):
         errHandle.DoError("add_list")
         return False
 
+# ----------------------------------------------------------------------------------
+# Name :    write_stream
+# Goal :    Write the workbook for [sMethod] in write-only mode, one row at a time
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+@util.profiler.timed()
+def write_stream(oInput, sMethod, flOutput, bPlain=False):
+    """Write [oInput] to [flOutput] using a write-only workbook"""
+
+    import openpyxl
+
+    try:
+        wbOutput = openpyxl.Workbook(write_only=True)
+        styles = StyleRegistry(wbOutput, bPlain)
+        for sTitle, lNames, lColumns in get_layout(oInput, sMethod):
+            errHandle.Status("Processing sheet: " + sTitle)
+            sheet = wbOutput.create_sheet(sTitle)
+            if not add_rows(sheet, lNames, lColumns, styles):
+                return False
+        with util.profiler.stage("save"):
+            wbOutput.save(flOutput)
+        return True
+    except:
+        errHandle.DoError("write_stream")
+        return False
+
+@util.profiler.timed()
+def add_rows(wsThis, lNames, lColumns, styles=None):
+    """Add headers [lNames] and the column lists [lColumns] row by row to write-only sheet [wsThis]"""
+
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils.cell import get_column_letter
+
+    try:
+        if styles == None: styles = StyleRegistry(wsThis.parent)
+        # Column widths must be known before the first row is written
+        for col_num in range(1, len(lNames) + 1):
+            wsThis.column_dimensions[get_column_letter(col_num)].width = 20.0
+        # The header row
+        lRow = []
+        for sName in lNames:
+            c = WriteOnlyCell(wsThis, value=sName)
+            styles.header(c)
+            lRow.append(c)
+        wsThis.append(lRow)
+        # Turn the columns into rows: columns may differ in length
+        for tRow in get_rows(lColumns):
+            lRow = []
+            for value in tRow:
+                if value is None:
+                    # This column has ended
+                    lRow.append(None)
+                else:
+                    c = WriteOnlyCell(wsThis, value=value)
+                    styles.cell(c)
+                    lRow.append(c)
+            wsThis.append(lRow)
+        # Return okay
+        return True
+    except:
+        # Show the error
+        errHandle.DoError("add_rows")
+        return False
+
+# ----------------------------------------------------------------------------------
+# Name :    process_batch
+# Goal :    Convert all JSON files in a directory (or matching a glob) in parallel
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def process_batch(oArgs):
+    """Convert each input of the batch [oArgs] to the output directory, using [jobs] processes"""
+
+    try:
+        flInput = oArgs["input"]
+        dirOutput = oArgs["output"]
+        sMethod = oArgs.get("method", "compact")
+        sFormat = oArgs.get("format", "xlsx")
+        iJobs = oArgs.get("jobs", 1)
+
+        # Get the input files
+        if os.path.isdir(flInput):
+            lInput = sorted(glob.glob(os.path.join(flInput, "*.json")))
+        else:
+            lInput = sorted(glob.glob(flInput))
+        if len(lInput) == 0:
+            errHandle.Status("No input files found for " + flInput)
+            return False
+        if os.path.exists(dirOutput) and not os.path.isdir(dirOutput):
+            errHandle.Status("Please specify an output DIRECTORY")
+            return False
+        if not os.path.exists(dirOutput):
+            os.makedirs(dirOutput)
+
+        # Make a job for each input whose output is missing or older
+        lJobs = []
+        lSummary = []
+        for flFile in lInput:
+            sName = os.path.splitext(os.path.basename(flFile))[0]
+            flOutput = os.path.join(dirOutput, sName)
+            lTarget = [get_output_name(flOutput, sOne, sFormat) for sOne in sMethod.split(",")]
+            if all(os.path.exists(flTarget) and os.path.getmtime(flTarget) >= os.path.getmtime(flFile) for flTarget in lTarget):
+                lSummary.append((flFile, None, 0.0, "up to date"))
+            else:
+                # Each file is converted on its own within one process
+                lJobs.append(dict(oArgs, input=flFile, output=flOutput, jobs=1))
+        errHandle.Status("Converting {} of {} files with {} processes".format(len(lJobs), len(lInput), iJobs))
+
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=max(1, iJobs)) as executor:
+            for tResult in executor.map(convert_one, lJobs):
+                lSummary.append(tResult)
+                if tResult[3] == "ok":
+                    util.profiler.count("rows_written", tResult[1])
+                    util.profiler.count("files_converted")
+
+        # Show a summary table
+        lSummary.sort()
+        iWidth = max(len(os.path.basename(tRow[0])) for tRow in lSummary)
+        print("{:<{}}  {:>10}  {:>8}  {}".format("File", iWidth, "Rows", "Seconds", "Status"))
+        for flFile, iRows, fSeconds, sStatus in lSummary:
+            sRows = "" if iRows == None else str(iRows)
+            print("{:<{}}  {:>10}  {:>8.2f}  {}".format(os.path.basename(flFile), iWidth, sRows, fSeconds, sStatus))
+        return all(tRow[3] != "error" for tRow in lSummary)
+    except:
+        errHandle.DoError("process_batch")
+        return False
+
+def convert_one(oArgs):
+    """Convert one input of a batch: return (input, rows, seconds, status)"""
+
+    fStart = time.time()
+    bOkay = process_bsco(oArgs)
+    return (oArgs['input'], oArgs.get('rows'), time.time() - fStart, "ok" if bOkay else "error")
+
+def is_batch(flInput):
+    """Check if [flInput] is a directory or a glob pattern instead of one file"""
+
+    # A file name like export[1].json is a file, not a pattern
+    if os.path.isfile(flInput):
+        return False
+    return os.path.isdir(flInput) or glob.has_magic(flInput)
+
+def get_output_name(flOutput, sMethod, sFormat):
+    """Get the name of the (first) file that process_bsco writes for [flOutput]"""
+
+    flBase = "{}_{}".format(flOutput.split(sep=".")[0], sMethod)
+    if sFormat == "xlsx" or sFormat == "sqlite":
+        return "{}.{}".format(flBase, sFormat)
+    # One file per sheet: take the first one
+    sTitle = "Compact" if sMethod == "compact" else lStructure[0]['name']
+    return "{}_{}.{}".format(flBase, sTitle, sFormat)
+
+# ----------------------------------------------------------------------------------
+# Name :    write_output
+# Goal :    Write the sheets of [sMethod] in the columnar format [sFormat]
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+@util.profiler.timed()
+def write_output(oInput, sMethod, flBase, sFormat):
+    """Write [oInput] in output format [sFormat] to files starting with [flBase]"""
+
+    try:
+        oOutput = outputs.OUTPUTS[sFormat](flBase)
+        for sTitle, lNames, lColumns in get_layout(oInput, sMethod):
+            errHandle.Status("Processing sheet: " + sTitle)
+            iRows = oOutput.write_sheet(sTitle, lNames, get_rows(lColumns))
+            errHandle.Status("   rows: {}".format(iRows))
+        for flOutput in oOutput.close():
+            errHandle.Status("Saved " + flOutput)
+        return True
+    except:
+        errHandle.DoError("write_output")
+        return False
+
+# ----------------------------------------------------------------------------------
+# Name :    write_parallel
+# Goal :    Write the sheets of the full method in [iJobs] processes
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+@util.profiler.timed()
+def write_parallel(oInput, flOutput, bPlain=False, iJobs=2):
+    """Make one worksheet part per sheet in parallel, and assemble [flOutput] from the parts"""
+
+    dirTemp = tempfile.mkdtemp(prefix="bsco_", dir=os.path.dirname(os.path.abspath(flOutput)))
+    try:
+        lSheets = []
+        lFutures = []
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=iJobs) as executor:
+            for idx, sheetobject in enumerate(lStructure):
+                flPart = os.path.join(dirTemp, "sheet{}.xml".format(idx + 1))
+                lSheets.append((sheetobject['name'], flPart))
+                # A worker only gets the columns it needs
+                if isinstance(oInput, dict):
+                    oPart = {sheetobject['name']: oInput[sheetobject['name']]}
+                else:
+                    oPart = oInput
+                lFutures.append(executor.submit(make_part, oPart, sheetobject, flPart, bPlain))
+            for sheetobject, future in zip(lStructure, lFutures):
+                errHandle.Status("Sheet {}: {} rows".format(sheetobject['name'], future.result()))
+        xlsxparts.assemble(flOutput, lSheets)
+        return True
+    except:
+        errHandle.DoError("write_parallel")
+        return False
+    finally:
+        shutil.rmtree(dirTemp, ignore_errors=True)
+
+def make_part(oInput, sheetobject, flPart, bPlain=False):
+    """Normalize the columns of one sheet and write them to the worksheet part [flPart]"""
+
+    sTitle, lNames, lColumns = get_sheet(oInput, sheetobject)
+    return xlsxparts.write_part(flPart, lNames, get_rows(lColumns), bPlain)
+
 # ----------------------------------------------------------------------------------
 # Goal :  If user calls this as main, then follow up on it
 # ----------------------------------------------------------------------------------
@@ -0,0 +1,125 @@
+"""On-disk cache of parsed and normalized BSCO input
+
+A cache entry holds the normalized lStructure columns of one JSON input
+(see columns.normalize_input), pickled with the highest protocol. The
+entry is keyed by the absolute path, size, modification time and SHA-1 of
+the input, so that a changed input never hits an old entry. Entries are
+evicted when they are older than the maximum age, and then by least
+recent use until the total size fits; the newest entry is always kept.
+Several processes may share the cache directory: an entry that another
+process removed in the meantime is simply a miss.
+
+"""
+import hashlib
+import io
+import os
+import pickle
+import tempfile
+import time
+
+from util import ErrHandle
+
+# Default limits of the cache
+MAX_SIZE = 2 * 1024 * 1024 * 1024   # bytes
+MAX_AGE = 30 * 24 * 3600            # seconds
+# Extension of the cache entries
+EXTENSION = ".pickle"
+
+
+class InputCache():
+    """A directory with parsed BSCO input"""
+
+    def __init__(self, dirCache, iMaxSize=MAX_SIZE, iMaxAge=MAX_AGE):
+        self.dirCache = dirCache
+        self.iMaxSize = iMaxSize
+        self.iMaxAge = iMaxAge
+        self.oErr = ErrHandle()
+        if not os.path.isdir(dirCache):
+            os.makedirs(dirCache)
+
+    def get_key(self, flInput):
+        """Get the key of [flInput] from its path, size, modification time and content"""
+
+        oStat = os.stat(flInput)
+        oHash = hashlib.sha1()
+        with io.open(flInput, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                oHash.update(chunk)
+        sId = "{}|{}|{}|{}".format(os.path.abspath(flInput), oStat.st_size, oStat.st_mtime_ns, oHash.hexdigest())
+        return hashlib.sha1(sId.encode("utf-8")).hexdigest()
+
+    def get_file(self, sKey):
+        return os.path.join(self.dirCache, sKey + EXTENSION)
+
+    def get(self, sKey):
+        """Return the cached data of [sKey], or None"""
+
+        flEntry = self.get_file(sKey)
+        try:
+            with io.open(flEntry, "rb") as f:
+                oData = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except:
+            # A damaged entry is simply dropped
+            self.oErr.Status("Dropping cache entry {}: {}".format(flEntry, self.oErr.get_error_message()))
+            self.remove(flEntry)
+            return None
+        try:
+            # Mark the entry as recently used
+            os.utime(flEntry)
+        except FileNotFoundError:
+            pass
+        return oData
+
+    def put(self, sKey, oData):
+        """Store [oData] under [sKey] and keep the cache within its limits"""
+
+        flEntry = self.get_file(sKey)
+        # Each writer has a file of its own until the entry is complete
+        fd, sTemp = tempfile.mkstemp(suffix=".part", prefix=sKey, dir=self.dirCache)
+        try:
+            with io.open(fd, "wb") as f:
+                pickle.dump(oData, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(sTemp, flEntry)
+        except:
+            self.remove(sTemp)
+            raise
+        self.evict(flEntry)
+
+    def remove(self, flEntry):
+        """Remove [flEntry], unless another process did so already"""
+
+        try:
+            os.remove(flEntry)
+        except FileNotFoundError:
+            pass
+
+    def evict(self, flKeep=None):
+        """Remove entries older than the maximum age, then the least recently used ones beyond the maximum size
+
+        The entry [flKeep], just stored, or else the most recent one, stays even if
+        it alone is larger than the maximum size.
+        """
+
+        now = time.time()
+        lEntries = []
+        for sName in os.listdir(self.dirCache):
+            if not sName.endswith(EXTENSION):
+                continue
+            flEntry = os.path.join(self.dirCache, sName)
+            try:
+                oStat = os.stat(flEntry)
+            except FileNotFoundError:
+                continue
+            if now - oStat.st_mtime > self.iMaxAge:
+                self.remove(flEntry)
+            else:
+                lEntries.append((oStat.st_mtime, oStat.st_size, flEntry))
+        # The entry to keep first, then the most recently used
+        lEntries.sort(key=lambda oEntry: (oEntry[2] == flKeep, oEntry[0]), reverse=True)
+        iTotal = 0
+        for idx, (mtime, size, flEntry) in enumerate(lEntries):
+            iTotal += size
+            if iTotal > self.iMaxSize and idx > 0:
+                self.remove(flEntry)
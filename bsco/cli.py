@@ -0,0 +1,63 @@
+# ==========================================================================================================
+# Name :    cli
+# Goal :    One entry point for the BSCO and CRMM tools, with a subcommand per task:
+#               bsco convert    convert a BSCO JSON export (bsco.py)
+#               bsco query      look up records of a BSCO export (query.py)
+#               crmm fetch      read the CRMM index and download the files (crmm.py)
+#               crmm index      only write the _info.json of the CRMM index (crmm.py --index-only)
+#               crmm validate   check and index downloaded CRMM files (validate.py)
+#               crmm files      list or extract downloaded CRMM files (storage.py)
+#               benchmark       run the benchmarks (benchmark.py)
+#               service         take conversion and download jobs over HTTP (service.py)
+#           Only the module of the subcommand is imported, and the modules
+#           import openpyxl, requests and pyarrow only where they are used.
+# History:
+# 18/oct/2026    ERK Created
+# ==========================================================================================================
+import sys
+import importlib
+
+# Per subcommand: the module whose main() does the work, and the arguments put in front
+oCommands = {
+    ("bsco", "convert"):    ("bsco", []),
+    ("bsco", "query"):      ("query", []),
+    ("crmm", "fetch"):      ("crmm", []),
+    ("crmm", "index"):      ("crmm", ["--index-only"]),
+    ("crmm", "validate"):   ("validate", []),
+    ("crmm", "files"):      ("storage", []),
+    ("benchmark",):         ("benchmark", []),
+    ("service",):           ("service", []),
+}
+
+# ----------------------------------------------------------------------------------
+# Name :    main
+# Goal :    Find the subcommand in [argv] and pass the other arguments to it
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def main(prgName, argv) :
+  # Adapt the program name to exclude the directory
+  index = prgName.rfind("\\")
+  if (index > 0) :
+    prgName = prgName[index+1:]
+  tCommand = None
+  for iLength in (2, 1):
+    if tuple(argv[:iLength]) in oCommands:
+      tCommand = tuple(argv[:iLength])
+      break
+  if tCommand == None:
+    print("Syntax: {} <command> [<options>], with <command> one of:".format(prgName))
+    for tThis in sorted(oCommands):
+      print("    " + " ".join(tThis))
+    print("Use <command> -h for the options of a command")
+    return False
+  sModule, lExtra = oCommands[tCommand]
+  module = importlib.import_module(sModule)
+  return module.main("{} {}".format(prgName, " ".join(tCommand)), lExtra + argv[len(tCommand):])
+
+# ----------------------------------------------------------------------------------
+# Goal :  If user calls this as main, then follow up on it
+# ----------------------------------------------------------------------------------
+if __name__ == "__main__":
+  # Call the main function with two arguments: program name + remainder
+  main(sys.argv[0], sys.argv[1:])
@@ -0,0 +1,154 @@
+"""Column extraction and value normalization for BSCO column lists
+
+Each item of a BSCO column is a JSON value. Before it can be written to a
+cell (or any other output) it is turned into a plain scalar: None becomes
+an empty string, a one-item list becomes its item, and everything that is
+not a string or an integer becomes its JSON text. Strings that start with
+'=' are JSON-quoted, so that Excel does not take them for formulas.
+
+"""
+import itertools
+import json
+
+# Maximum number of json.dumps() results remembered per column
+MEMO_SIZE = 10000
+
+# The sheets of a BSCO export and their columns
+lStructure = [
+        {"name": "Documents", "header": []},
+        {"name": "Bookseller", "header": ["Name"]},
+        {"name": "Catalogue", "header": ["Annotation", "Pages (original)", "Scanned", "Type",
+                                     "Literature", "Pages", "Collation", "Manuscript notes",
+                                     "Scanned copy", "Location", "Title", "Location (original)",
+                                     "Title page transcription"]},
+        {"name": "Citation", "header": ["Title", "URL", "ID", "Type"]},
+        {"name": "Owner", "header": ["Profession", "Location", "Name"]},
+        {"name": "Auction", "header": ["Venue", "Year", "Location", "Date"]}
+        ]
+
+
+class NormalizedColumn(list):
+    """A column list whose items already are cell values"""
+    pass
+
+def normalize_column(lThis, oMemo=None):
+    """Return an iterator over the cell values of column [lThis]"""
+
+    if isinstance(lThis, NormalizedColumn):
+        return iter(lThis)
+    return normalize_items(lThis, oMemo)
+
+def normalize_items(lThis, oMemo=None):
+    """Yield the value of each item of column [lThis]
+
+    The JSON text of repeated strings and lists of strings is remembered in
+    [oMemo], so that json.dumps() is only called once for each of them.
+    """
+
+    if oMemo == None: oMemo = {}
+    dumps = json.dumps
+    for item in lThis:
+        tItem = type(item)
+        if tItem is str:
+            if item.startswith("="):
+                sValue = oMemo.get(item)
+                if sValue == None:
+                    sValue = dumps(item)
+                    if len(oMemo) < MEMO_SIZE: oMemo[item] = sValue
+                yield sValue
+            else:
+                yield item
+        elif item is None:
+            yield ""
+        elif tItem is int:
+            yield item
+        elif tItem is list:
+            if len(item) == 1:
+                fItem = item[0]
+                if fItem is None:
+                    yield ""
+                    continue
+                elif not (type(fItem) is str and fItem.startswith("=")):
+                    yield fItem
+                    continue
+            # Only lists of strings can be remembered
+            for fItem in item:
+                if type(fItem) is not str:
+                    yield dumps(item)
+                    break
+            else:
+                key = tuple(item)
+                sValue = oMemo.get(key)
+                if sValue == None:
+                    sValue = dumps(item)
+                    if len(oMemo) < MEMO_SIZE: oMemo[key] = sValue
+                yield sValue
+        else:
+            yield dumps(item)
+
+def get_rows(lColumns):
+    """Yield tuples of the normalized values of [lColumns], with None where a column has ended"""
+
+    return itertools.zip_longest(*[normalize_column(lThis) for lThis in lColumns])
+
+def get_sheet(oInput, sheetobject):
+    """Return (title, headers, columns) of the worksheet for [sheetobject] in the full method"""
+
+    sheetName = sheetobject["name"]
+    lHeader = sheetobject['header']
+    if len(lHeader) == 0:
+        # There are no columns, there is just a list
+        return sheetName, ["no header"], [oInput[sheetName]]
+    else:
+        return sheetName, lHeader, [oInput[sheetName][colName] for colName in lHeader]
+
+def count_rows(oInput):
+    """Return the number of data rows of [oInput]: the length of its longest lStructure column"""
+
+    if hasattr(oInput, "count_rows"):
+        # Incrementally read input knows the lengths of its columns
+        return oInput.count_rows()
+    iRows = 0
+    for sheetobject in lStructure:
+        sTitle, lNames, lColumns = get_sheet(oInput, sheetobject)
+        for lThis in lColumns:
+            iRows = max(iRows, len(lThis))
+    return iRows
+
+def normalize_input(oInput):
+    """Return the lStructure columns of [oInput] as NormalizedColumn lists, in the same shape"""
+
+    oNormal = {}
+    for sheetobject in lStructure:
+        sheetName = sheetobject["name"]
+        lHeader = sheetobject['header']
+        if len(lHeader) == 0:
+            oNormal[sheetName] = NormalizedColumn(normalize_items(oInput[sheetName]))
+        else:
+            oNormal[sheetName] = {}
+            for colName in lHeader:
+                oNormal[sheetName][colName] = NormalizedColumn(normalize_items(oInput[sheetName][colName]))
+    return oNormal
+
+def get_layout(oInput, sMethod):
+    """Yield (title, headers, columns) for each worksheet of [sMethod]"""
+
+    if sMethod == "full":
+        # One worksheet per sheet of the structure
+        for sheetobject in lStructure:
+            yield get_sheet(oInput, sheetobject)
+    elif sMethod == "compact":
+        # All columns of all sheets on one worksheet
+        lNames = []
+        lColumns = []
+        for sheetobject in lStructure:
+            sheetName = sheetobject["name"]
+            lHeader = sheetobject['header']
+            if len(lHeader) == 0:
+                lNames.append(sheetName)
+                lColumns.append(oInput[sheetName])
+            else:
+                for colName in lHeader:
+                    lNames.append("{}.{}".format(sheetName, colName))
+                    lColumns.append(oInput[sheetName][colName])
+        yield "Compact", lNames, lColumns
@@ -10,14 +10,19 @@
 # ==========================================================================================================
 import sys, getopt, os.path, importlib
 import util, json, io
-import openpyxl
-import requests
-from openpyxl.utils.cell import get_column_letter
-from openpyxl import Workbook, load_workbook
+import queue
+import threading
 from models import CrmmInfo
+from manifest import Manifest
+from journal import Journal
+import storage
+import xlsxindex
+import validate
 
 # ============================= LOCAL VARIABLES ====================================
 errHandle = util.ErrHandle()
+# Records waiting in the download queue, per worker
+QUEUE_PER_WORKER = 4
 
 # ----------------------------------------------------------------------------------
 # Name :    main
@@ -28,17 +33,27 @@ errHandle = util.ErrHandle()
 def main(prgName, argv) :
   flInput = ''        # input Excel file name
   flOutput = ''       # output directory where .psd and .meta.xml files should come
+  iWorkers = 1        # Number of parallel downloads
+  bSync = False       # Only download what changed, according to the manifest
+  bResume = False     # Only handle the records that the journal has as unfinished
+  bRetryFailed = False  # Only handle the records that the journal has as failed
+  sStorage = "plain"  # How the downloaded files are stored: one of storage.STORES
+  fRate = None        # Maximum number of requests per second per host
+  sReader = 'load'    # Index reader: "load" (openpyxl) or "stream" (only the needed XML)
+  bValidate = False   # Check the downloaded files and write an index of them
+  bDownload = True    # Download the files, or only write the _info.json file
+  flProfile = ''      # JSON file for the timing and memory report
 
   try:
     # Adapt the program name to exclude the directory
     index = prgName.rfind("\\")
     if (index > 0) :
       prgName = prgName[index+1:]
-    sSyntax = prgName + ' -i <input Excel file> -o <output directory>'
+    sSyntax = prgName + ' [-s] [-v] [--index-only] [-r <load|stream>] [-w <workers>] [-z <plain|gzip|zstd|pack>] [--rate <requests per second>] [--resume] [--retry-failed] [--profile <report.json>] -i <input Excel file> -o <output directory>'
     # get all the arguments
     try:
       # Get arguments and options
-      opts, args = getopt.getopt(argv, "hi:o:", ["-inputfile=","-outputdir="])
+      opts, args = getopt.getopt(argv, "hsvr:w:z:i:o:", ["sync","validate","reader=","workers=","storage=","-inputfile=","-outputdir=","profile=","resume","retry-failed","rate=","index-only"])
     except getopt.GetoptError:
       print(sSyntax)
       sys.exit(2)
@@ -47,6 +62,26 @@ def main(prgName, argv) :
       if opt in ("-h", "--help"):
         print(sSyntax)
         sys.exit(0)
+      elif opt == "--profile":
+        flProfile = arg
+      elif opt == "--index-only":
+        bDownload = False
+      elif opt == "--rate":
+        fRate = float(arg)
+      elif opt == "--resume":
+        bResume = True
+      elif opt == "--retry-failed":
+        bRetryFailed = True
+      elif opt in ("-s", "--sync"):
+        bSync = True
+      elif opt in ("-v", "--validate"):
+        bValidate = True
+      elif opt in ("-r", "--reader"):
+        sReader = arg
+      elif opt in ("-w", "--workers"):
+        iWorkers = int(arg)
+      elif opt in ("-z", "--storage"):
+        sStorage = arg
       elif opt in ("-i", "--ifile", "--inputfile"):
         flInput = arg
       elif opt in ("-o", "--odir", "--outputdir"):
@@ -57,10 +92,34 @@ def main(prgName, argv) :
     # Continue with the program
     errHandle.Status('Input is "' + flInput + '"')
     errHandle.Status('Output is "' + flOutput + '"')
+    errHandle.Status('Index reader is "' + sReader + '"')
+    errHandle.Status('Workers: {}'.format(iWorkers))
+    errHandle.Status('Sync mode: {}'.format(bSync))
+    errHandle.Status('Validate: {}'.format(bValidate))
+    errHandle.Status('Storage: {}'.format(sStorage))
+    if fRate != None:
+      errHandle.Status('Rate: {} requests per second per host'.format(fRate))
+    errHandle.Status('Resume: {} Retry failed: {}'.format(bResume, bRetryFailed))
+    if flProfile != '':
+      errHandle.Status('Profile report is "' + flProfile + '"')
+      util.profiler.start_trace()
     # Call the function that does the job
     oArgs = {'input': flInput,
-             'output': flOutput}
-    if (process_crmm(oArgs)) :
+             'output': flOutput,
+             'workers': iWorkers,
+             'sync': bSync,
+             'resume': bResume,
+             'retry_failed': bRetryFailed,
+             'storage': sStorage,
+             'rate': fRate,
+             'reader': sReader,
+             'validate': bValidate,
+             'download': bDownload}
+    bOkay = process_crmm(oArgs)
+    if flProfile != '':
+      util.profiler.snapshot("end")
+      util.profiler.save(flProfile)
+    if (bOkay) :
       errHandle.Status("Ready")
     else :
       errHandle.DoError("Could not complete")
@@ -80,6 +139,15 @@ def process_crmm(oArgs):
     flInput = ""    # 
     flOutput = ""   # Output JSON file
     dirOutput = ""  # Output directory
+    iWorkers = 1    # Number of parallel downloads
+    bSync = False   # Use conditional requests based on the manifest
+    bResume = False         # Continue the run recorded in the journal
+    bRetryFailed = False    # Retry the records the journal has as failed
+    sStorage = "plain"      # How the downloaded files are stored
+    fRate = None            # Requests per second per host
+    sReader = "load"        # Index reader: "load" or "stream"
+    bValidate = False       # Check the files and index them
+    bDownload = True        # Download the files after reading the index
     arInput = []    # Array of input files
     arOutput = []   # Array of output files
     lOutput = []    # List of output objects (one per hit)
@@ -88,6 +156,15 @@ def process_crmm(oArgs):
         # Recover the arguments
         if "input" in oArgs: flInput = oArgs["input"]
         if "output" in oArgs: dirOutput = oArgs["output"]
+        if "workers" in oArgs: iWorkers = oArgs["workers"]
+        if "sync" in oArgs: bSync = oArgs["sync"]
+        if "resume" in oArgs: bResume = oArgs["resume"]
+        if "retry_failed" in oArgs: bRetryFailed = oArgs["retry_failed"]
+        if "storage" in oArgs: sStorage = oArgs["storage"]
+        if "rate" in oArgs: fRate = oArgs["rate"]
+        if "reader" in oArgs: sReader = oArgs["reader"]
+        if "validate" in oArgs: bValidate = oArgs["validate"]
+        if "download" in oArgs: bDownload = oArgs["download"]
 
         # Check input file
         if not os.path.isfile(flInput):
@@ -101,61 +178,69 @@ def process_crmm(oArgs):
                 errHandle.Status("Please specify an output DIRECTORY")
                 return False
 
+        # Check the storage
+        if sStorage not in storage.STORES:
+            errHandle.Status("Unknown storage: {}".format(sStorage))
+            return False
+        elif sStorage == "zstd" and not storage.has_zstandard():
+            errHandle.Status("The zstd storage needs zstandard")
+            return False
+
         # Create an output file name
         flOutput = dirOutput.split(sep=".")[0]
+        flManifest = "{}_manifest.json".format(flOutput)
+        flJournal = "{}_journal.jsonl".format(flOutput)
         flOutput = "{}_info.json".format(flOutput)
 
-        # Open the input file and read it as Excel
-        wbInput = openpyxl.load_workbook(filename=flInput)
-        # Assume the active worksheet
-        ws = wbInput.active
-        # Walk through all rows in the worksheet
-        row = 2
-        bFinish = False
-        info_list = []
-        info_out = []
-        while not bFinish:
-            # Get the record number
-            recnum = ws.cell(column=1, row=row).value
-            bFinish = (recnum == None or recnum == "")
-            if recnum == 96 or recnum == "96":
-                iStop = 1
-            if not bFinish:
-                # We can still read this one
-                filenum = ws.cell(column=2, row=row).value
-                cell_mrg = ws.cell(column=3, row=row)
-                cell_meta = ws.cell(column=4, row=row)
-                loc_wijk = ws.cell(column=5, row=row).value
-                loc_gron = ws.cell(column=6, row=row).value
-                loc_have = ws.cell(column=7, row=row).value
-                location = get_location(loc_wijk, loc_gron, loc_have)
-                # Get the correct file name and link from [cell_mrg]
-                mrg_name = cell_mrg.value
-                mrg_url = cell_mrg.hyperlink.target
-                # Get the correct hyperlink from [cell_meta]
-                meta_url = cell_meta.hyperlink.target
-                # Create an Information object that holds all of this
-                oInfo = CrmmInfo(line=row, filenum=filenum, mrg_name=mrg_name, mrg_url=mrg_url, meta_url=meta_url, location=location)
-                # Add this object to a list
-                info_list.append(oInfo)
-                info_out.append(oInfo.get_json())
-            # Go to the next row
-            row += 1
-
-        # Write the list of Crmm Info to a JSON file
-        with io.open(flOutput, "w", encoding='utf-8-sig') as f:
-            json.dump(info_out, f)
-
-        # Walk the list of Crmm Info
-        for oInfo in info_list:
-            # Download the MRG to the target
-            oResult = oInfo.create_psd(dirOutput)
-            if oResult['status'] != "ok":
-                errHandle.Status("Could not read PSD for {}".format(oInfo['filenum']))
-            # Download and save the metadata
-            oResult = oInfo.create_meta(dirOutput)
-            if oResult['status'] != "ok":
-                errHandle.Status("Could not read metadata for {}".format(oInfo['filenum']))
+        with util.profiler.stage("index"):
+            if sReader == "stream":
+                # Only read the needed cells and links from the XML
+                info_iter = read_index_lean(flInput)
+            else:
+                # Open the input file and read it as Excel
+                import openpyxl
+                wbInput = openpyxl.load_workbook(filename=flInput)
+                # Assume the active worksheet
+                info_iter = read_index(wbInput.active)
+        util.profiler.snapshot("indexed")
+
+        if not bDownload:
+            # Only write the records to the JSON file
+            oCount = {'records': 0, 'todo': 0}
+            with util.profiler.stage("info_json"):
+                with io.open(flOutput, "w", encoding='utf-8-sig') as f:
+                    for oInfo in get_todo(info_iter, f, None, oCount=oCount):
+                        pass
+            errHandle.Status("Records: {}".format(oCount['records']))
+            util.profiler.count("records", oCount['records'])
+            return True
+
+        # Each record goes to the JSON file and, when needed, on to the downloads
+        manifest = Manifest(flManifest) if bSync else None
+        journal = Journal(flJournal, bResume or bRetryFailed)
+        store = storage.STORES[sStorage](dirOutput)
+        oCount = {'records': 0, 'todo': 0}
+        try:
+            with io.open(flOutput, "w", encoding='utf-8-sig') as f:
+                info_todo = get_todo(info_iter, f, journal, bResume, bRetryFailed, oCount, store)
+                with util.profiler.stage("pipeline"):
+                    download_info(info_todo, dirOutput, iWorkers, manifest, journal, store, fRate)
+            errHandle.Status("Records handled: {} of {}".format(oCount['todo'], oCount['records']))
+            util.profiler.count("records", oCount['records'])
+            util.profiler.count("records_skipped", oCount['records'] - oCount['todo'])
+            if bValidate:
+                with util.profiler.stage("validate"):
+                    lInvalid = validate.validate_dir(dirOutput, store)
+                for oRecord, oPsd, oMeta in lInvalid:
+                    # Drop the invalid files, so that --retry-failed gets them again
+                    oInfo = CrmmInfo(**oRecord)
+                    if oPsd['status'] == "error": store.remove("crmm_{}.psd".format(oInfo.filenum))
+                    if oMeta['status'] == "error": store.remove("crmm_{}.meta.xml".format(oInfo.filenum))
+                    journal.finish(oInfo, oPsd, oMeta)
+            errHandle.Status("Journal: {}".format(json.dumps(journal.get_counts(), sort_keys=True)))
+        finally:
+            store.close()
+            journal.close()
 
         # We are happy: return okay
         return True
@@ -166,6 +251,137 @@ def process_crmm(oArgs):
         return False
 
 
+def get_todo(info_iter, f, journal, bResume=False, bRetryFailed=False, oCount=None, store=None):
+    """Write each record of [info_iter] to the JSON array in [f] and yield the ones to download
+
+    Without a [journal], all records are yielded. The [store] lets a
+    resumed run check that the records that are done have their files.
+
+    The array is written as the records pass, so the file looks like the
+    one json.dump() would write for the list of all of them.
+    """
+
+    if oCount == None: oCount = {'records': 0, 'todo': 0}
+    f.write("[")
+    for oInfo in info_iter:
+        if oCount['records'] > 0:
+            f.write(", ")
+        f.write(json.dumps(oInfo.get_json()))
+        oCount['records'] += 1
+        if journal == None or journal.wants(oInfo, bResume, bRetryFailed, store):
+            oCount['todo'] += 1
+            yield oInfo
+    f.write("]")
+
+# ----------------------------------------------------------------------------------
+# Name :    download_info
+# Goal :    Download the PSD and metadata of all items in [info_list] in parallel
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def download_info(info_list, dirOutput, iWorkers=1, manifest=None, journal=None, store=None, fRate=None):
+    """Download PSD and metadata for all of [info_list] using [iWorkers] threads
+
+    [info_list] may be a generator: its items go into a bounded queue as the
+    workers are ready for them, so reading and downloading overlap.
+    With a [manifest], only the files that changed are downloaded again.
+    With a [journal], the state of each item is recorded as it changes.
+    With a [store], the files are compressed or packed once downloaded.
+    With [fRate], each host gets at most that many requests per second.
+    """
+
+    # The downloader needs requests, which is slow to load
+    from downloader import Downloader
+
+    oDownloader = Downloader(workers=iWorkers, rate=fRate)
+    qInfo = queue.Queue(maxsize=oDownloader.workers * QUEUE_PER_WORKER)
+
+    def work():
+        while True:
+            oInfo = qInfo.get()
+            if oInfo is None:
+                return
+            try:
+                # Each item gets its PSD and then its metadata downloaded
+                oInfo, oPsd, oMeta = download_one(oInfo, dirOutput, oDownloader, manifest, journal, store)
+                if oPsd['status'] != "ok":
+                    errHandle.Status("Could not read PSD for {}".format(oInfo.filenum))
+                if oMeta['status'] != "ok":
+                    errHandle.Status("Could not read metadata for {}".format(oInfo.filenum))
+            except:
+                errHandle.DoError("download_info")
+
+    lThreads = [threading.Thread(target=work, daemon=True) for i in range(oDownloader.workers)]
+    for thread in lThreads:
+        thread.start()
+    try:
+        for oInfo in info_list:
+            qInfo.put(oInfo)
+    finally:
+        # One end marker per worker
+        for thread in lThreads:
+            qInfo.put(None)
+        for thread in lThreads:
+            thread.join()
+        oDownloader.close()
+        if manifest != None:
+            manifest.save()
+
+def download_one(oInfo, dirOutput, oDownloader, manifest=None, journal=None, store=None):
+    """Download the PSD and the metadata of one item"""
+
+    if journal != None: journal.start(oInfo)
+    oPsd = oInfo.create_psd(dirOutput, download=oDownloader.download, manifest=manifest, store=store)
+    oMeta = oInfo.create_meta(dirOutput, download=oDownloader.download, manifest=manifest, store=store)
+    if journal != None: journal.finish(oInfo, oPsd, oMeta)
+    return oInfo, oPsd, oMeta
+
+# ----------------------------------------------------------------------------------
+# Name :    read_index
+# Goal :    Yield a CrmmInfo object for each row of the index worksheet [ws]
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def read_index(ws):
+    """Yield the CrmmInfo of each row of [ws], up to the first empty record number"""
+
+    # Hyperlink targets, keyed by cell coordinate
+    oLinks = get_hyperlinks(ws)
+    return get_info(ws.iter_rows(min_row=2, max_col=7, values_only=True), oLinks)
+
+def read_index_lean(flInput):
+    """Like read_index() for the active sheet of [flInput], without loading the workbook"""
+
+    rows, oLinks = xlsxindex.read_sheet(flInput, min_row=2, max_col=7)
+    return get_info(rows, oLinks)
+
+def get_info(lRows, oLinks):
+    """Yield a CrmmInfo for each of the value tuples [lRows], which start at row 2"""
+
+    row = 1
+    for tRow in lRows:
+        row += 1
+        # Allow for rows that are shorter than 7 cells
+        tRow = tuple(tRow) + (None,) * (7 - len(tRow))
+        recnum, filenum, mrg_name, meta_name, loc_wijk, loc_gron, loc_have = tRow
+        if recnum == None or recnum == "":
+            break
+        location = get_location(loc_wijk, loc_gron, loc_have)
+        # Get the links of the MRG (column C) and of the metadata (column D)
+        mrg_url = oLinks.get("C{}".format(row))
+        meta_url = oLinks.get("D{}".format(row))
+        yield CrmmInfo(line=row, filenum=filenum, mrg_name=mrg_name, mrg_url=mrg_url, meta_url=meta_url, location=location)
+
+def get_hyperlinks(ws):
+    """Get the targets of all hyperlinks in [ws] as a dictionary keyed by cell coordinate"""
+
+    oLinks = {}
+    # The reader binds each hyperlink of the sheet to its cell(s)
+    for c in ws._cells.values():
+        if c.hyperlink != None:
+            oLinks[c.coordinate] = c.hyperlink.target
+    return oLinks
+
 def get_location(wijk, gron, have):
     location = ""
     if wijk == 1 or wijk == "1":
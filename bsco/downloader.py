@@ -0,0 +1,226 @@
+"""Concurrent downloads for the CRMM reader
+
+All downloads share one requests.Session, so connections to the same host
+are pooled and reused. Each host gets a scheduler of its own:
+
+    - a token bucket limits the number of requests per second, and is put
+      on hold for as long as a Retry-After header of the host asks;
+    - an adaptive limit bounds the number of parallel connections. It grows
+      by one after a round of fast, successful downloads, and is halved
+      when the host gets slow or replies with an error.
+
+Failed downloads are retried with an exponential backoff.
+
+"""
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from models import downloadfile, downloadfile_to, DEFAULT_TIMEOUT
+from util import ErrHandle, profiler
+
+# Status codes that are worth another try
+RETRY_CODES = (429, 500, 502, 503, 504)
+# Status codes that say the host wants fewer requests
+THROTTLE_CODES = (429, 503)
+# Longest Retry-After that is honoured, in seconds
+MAX_RETRY_AFTER = 300
+# A reply this many times slower than the fastest recent one counts as slow
+SLOW_FACTOR = 3
+# Replies faster than this never count as slow
+MIN_LATENCY = 0.05
+# Least time between two decreases of the limit, in seconds
+COOLDOWN = 1.0
+
+
+class TokenBucket():
+    """Allow [rate] requests per second on average, with bursts of up to [burst]
+
+    Without a rate, requests are only held back by pause().
+    """
+
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+        self.hold = 0.0     # No request before this time
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a request may be sent"""
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.hold:
+                    wait = self.hold - now
+                elif not self.rate:
+                    return
+                else:
+                    self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                    self.stamp = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, delay):
+        """Send no requests for the next [delay] seconds"""
+
+        with self.lock:
+            hold = time.monotonic() + delay
+            if hold > self.hold:
+                self.hold = hold
+                # Start refilling from the end of the pause
+                self.tokens = 0
+                self.stamp = hold
+
+
+class AdaptiveLimit():
+    """Bound the parallel requests to one host, with a bound between 1 and [maximum]
+
+    Use it as a context manager around a request, and report the outcome
+    with success() or failure().
+    """
+
+    def __init__(self, initial, maximum):
+        self.maximum = max(1, maximum)
+        self.limit = max(1, min(initial, self.maximum))
+        self.active = 0
+        self.successes = 0
+        self.baseline = None    # Latency of the fastest recent reply
+        self.last_decrease = 0.0
+        self.cond = threading.Condition()
+
+    def __enter__(self):
+        with self.cond:
+            while self.active >= self.limit:
+                self.cond.wait()
+            self.active += 1
+        return self
+
+    def __exit__(self, *args):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+    def success(self, latency):
+        """A reply arrived after [latency] seconds: grow the limit if the host keeps up"""
+
+        with self.cond:
+            # Let the baseline drift up slowly, so one fast reply does not count forever
+            if self.baseline == None or latency < self.baseline * 1.01:
+                self.baseline = latency
+            else:
+                self.baseline *= 1.01
+            if latency > SLOW_FACTOR * max(self.baseline, MIN_LATENCY):
+                return self.decrease()
+            self.successes += 1
+            # One more connection after a full round of good replies
+            if self.successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self.successes = 0
+                self.cond.notify_all()
+            return False
+
+    def failure(self):
+        with self.cond:
+            return self.decrease()
+
+    def decrease(self):
+        """Halve the limit, at most once per COOLDOWN (the caller holds the lock)"""
+
+        now = time.monotonic()
+        self.successes = 0
+        if now - self.last_decrease < COOLDOWN or self.limit == 1:
+            return False
+        self.limit = max(1, self.limit // 2)
+        self.last_decrease = now
+        profiler.count("limit_decreases")
+        return True
+
+
+class Downloader():
+    """Download files with a shared session, per-host scheduling and retries
+
+    [per_host] is the initial number of parallel connections per host, which
+    adapts between 1 and [workers]. [rate] is the maximum number of requests
+    per second per host, or None for no limit.
+    """
+
+    def __init__(self, workers=1, per_host=4, retries=3, backoff=0.5, timeout=DEFAULT_TIMEOUT, rate=None, burst=1):
+        self.workers = max(1, workers)
+        self.per_host = max(1, per_host)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate = rate
+        self.burst = burst
+        self.oErr = ErrHandle()
+        # One session for all threads, with a pool large enough for all workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # The (limit, bucket) of each host
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def get_host(self, url):
+        """Get the adaptive limit and the token bucket of the host of [url]"""
+
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = (AdaptiveLimit(self.per_host, self.workers), TokenBucket(self.rate, self.burst))
+            return self.hosts[host]
+
+    def download(self, url, target=None, headers=None):
+        """Download [url], streamed into [target] if given: reply like models.downloadfile()"""
+
+        limit, bucket = self.get_host(url)
+        attempt = 0
+        while True:
+            bucket.acquire()
+            with limit:
+                if target == None:
+                    oBack = downloadfile(url, session=self.session, timeout=self.timeout)
+                else:
+                    oBack = downloadfile_to(url, target, session=self.session, timeout=self.timeout, headers=headers)
+            if oBack['status'] in ("ok", "unchanged"):
+                if limit.success(oBack.get('elapsed', 0)):
+                    self.oErr.Status("Slow replies: {} connection(s) to {}".format(limit.limit, urlparse(url).netloc))
+                return oBack
+            if oBack.get('bad_url'):
+                # A malformed link stays malformed, and says nothing about the host
+                return oBack
+            code = oBack.get('code')
+            # Connection errors and server-side trouble mean the host needs a rest
+            if not isinstance(code, int) or code in RETRY_CODES:
+                if limit.failure():
+                    self.oErr.Status("Errors: {} connection(s) to {}".format(limit.limit, urlparse(url).netloc))
+            retry_after = oBack.get('retry_after')
+            if code in THROTTLE_CODES:
+                profiler.count("throttled")
+                if retry_after != None:
+                    bucket.pause(min(retry_after, MAX_RETRY_AFTER))
+            if attempt >= self.retries:
+                return oBack
+            # Only retry connection errors and server-side trouble
+            if isinstance(code, int) and code not in RETRY_CODES:
+                return oBack
+            attempt += 1
+            profiler.count("retries")
+            delay = self.backoff * (2 ** (attempt - 1))
+            if retry_after != None:
+                delay = max(delay, min(retry_after, MAX_RETRY_AFTER))
+            self.oErr.Status("Retry {} of {} in {:.1f}s: {}".format(attempt, self.retries, delay, url))
+            time.sleep(delay)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,137 @@
+"""Run journal of the CRMM downloads
+
+The journal is a JSON Lines file next to the _info.json output. Each line
+records a change in the state of one record of the index, keyed by its
+file number:
+
+    inflight    downloading its PSD and metadata
+    done        both files are in place
+    failed      one of the files could not be downloaded (with the reason)
+
+A record without a line is pending: it has not been started yet.
+
+Lines are appended and synced to disk as they happen, so an interrupted
+run leaves a journal whose last line per record gives the state it got to.
+A resumed run then only has to handle the records that are not done.
+
+"""
+import io
+import json
+import os
+import threading
+
+PENDING = "pending"
+INFLIGHT = "inflight"
+DONE = "done"
+FAILED = "failed"
+
+
+class Journal():
+    """The state per record of a CRMM download run, appended to [flJournal]"""
+
+    def __init__(self, flJournal, bResume=False):
+        self.flJournal = flJournal
+        self.lock = threading.Lock()
+        self.oState = {}    # Per file number: {'state': ..., 'reason': ...}
+        if bResume and os.path.exists(flJournal):
+            self.load()
+            # Continue with one line per record instead of the whole history
+            self.compact()
+        self.f = io.open(flJournal, "a" if bResume else "w", encoding="utf-8")
+
+    def load(self):
+        """Replay the journal: the last line of each record wins"""
+
+        with io.open(self.flJournal, "r", encoding="utf-8") as f:
+            for sLine in f:
+                try:
+                    oLine = json.loads(sLine)
+                except ValueError:
+                    # The last line may have been cut off by the interruption
+                    continue
+                self.oState[oLine['key']] = oLine
+
+    def compact(self):
+        """Rewrite the journal with only the current state of each record"""
+
+        sTemp = self.flJournal + ".part"
+        with io.open(sTemp, "w", encoding="utf-8") as f:
+            for oLine in self.oState.values():
+                f.write(json.dumps(oLine) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(sTemp, self.flJournal)
+
+    def get_key(self, oInfo):
+        return str(oInfo.filenum)
+
+    def get_state(self, oInfo):
+        with self.lock:
+            oLine = self.oState.get(self.get_key(oInfo))
+        return PENDING if oLine == None else oLine['state']
+
+    def write(self, lLines):
+        """Append [lLines] and make sure they are on disk"""
+
+        with self.lock:
+            for oLine in lLines:
+                self.oState[oLine['key']] = oLine
+                self.f.write(json.dumps(oLine) + "\n")
+            self.f.flush()
+            os.fsync(self.f.fileno())
+
+    def wants(self, oInfo, bResume=False, bRetryFailed=False, store=None):
+        """Check if [oInfo] needs to be handled in this run
+
+        A fresh run handles all records. Resuming skips the records that are
+        done or failed; retrying failures only takes the failed ones. Both
+        together take everything that is not done.
+
+        With a [store], resuming also takes the records that are done, but
+        whose files the store does not have: an archive whose index was not
+        saved before the interruption has lost them.
+        """
+
+        if not bResume and not bRetryFailed:
+            return True
+        sState = self.get_state(oInfo)
+        if bResume and sState in (PENDING, INFLIGHT):
+            return True
+        if bResume and sState == DONE and store != None:
+            return not self.is_stored(oInfo, store)
+        return bRetryFailed and sState == FAILED
+
+    def is_stored(self, oInfo, store):
+        """Check if [store] has both files of [oInfo]"""
+
+        return store.exists("crmm_{}.psd".format(oInfo.filenum)) and \
+               store.exists("crmm_{}.meta.xml".format(oInfo.filenum))
+
+    def start(self, oInfo):
+        self.write([{'key': self.get_key(oInfo), 'state': INFLIGHT}])
+
+    def finish(self, oInfo, oPsd, oMeta):
+        """Record the outcome of downloading the PSD and the metadata of [oInfo]"""
+
+        lReason = []
+        for sFile, oBack in (("psd", oPsd), ("meta", oMeta)):
+            if oBack['status'] != "ok":
+                # The reason is an exception message or the HTTP status code
+                sReason = oBack.get('msg') or oBack.get('code') or oBack['status']
+                lReason.append("{}: {}".format(sFile, sReason))
+        if len(lReason) == 0:
+            self.write([{'key': self.get_key(oInfo), 'state': DONE}])
+        else:
+            self.write([{'key': self.get_key(oInfo), 'state': FAILED, 'reason': "; ".join(lReason)}])
+
+    def get_counts(self):
+        """Return the number of records per state"""
+
+        oCount = {}
+        with self.lock:
+            for oLine in self.oState.values():
+                oCount[oLine['state']] = oCount.get(oLine['state'], 0) + 1
+        return oCount
+
+    def close(self):
+        self.f.close()
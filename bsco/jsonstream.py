@@ -0,0 +1,271 @@
+"""Incremental reader for BSCO JSON exports
+
+A BSCO export is one JSON object with a list per sheet, or an object with
+a list per column of the sheet. The reader first scans the file once to
+find where each of the column lists starts, without building any of the
+values. Each column can then be read back as a generator that decodes one
+item at a time, so the document never has to be in memory as a whole.
+
+"""
+import io
+import json
+import re
+
+# Number of bytes read from the input file at a time
+CHUNK_SIZE = 1 << 16
+
+# Bytes that matter when skipping over strings, lists and objects
+re_special = re.compile(rb'["\[\]{}]')
+re_string_end = re.compile(rb'["\\]')
+re_scalar_end = re.compile(rb'[,\]}\s]')
+re_space = re.compile(rb'[ \t\r\n]*')
+
+
+class ByteScanner():
+    """Walk through the bytes of a JSON file without decoding them"""
+
+    def __init__(self, f, offset=0):
+        f.seek(offset)
+        self.f = f
+        self.base = offset      # File offset of self.buf[0]
+        self.buf = b""
+        self.pos = 0            # Current position in self.buf
+        self.mark = None        # Start of the value being captured
+
+    def _more(self):
+        """Read the next chunk into the buffer: return False at the end of the file"""
+
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            return False
+        # Only keep what is still needed
+        keep = self.pos if self.mark is None else self.mark
+        self.base += keep
+        self.buf = self.buf[keep:] + chunk
+        self.pos -= keep
+        if self.mark is not None:
+            self.mark = 0
+        return True
+
+    def _error(self, sMsg):
+        return ValueError("{} at offset {}".format(sMsg, self.tell()))
+
+    def tell(self):
+        return self.base + self.pos
+
+    def peek(self):
+        """Skip whitespace and return the next byte without consuming it (b'' at the end)"""
+
+        while True:
+            self.pos = re_space.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos:self.pos+1]
+            if not self._more():
+                return b""
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise self._error("Expected {}".format(ch.decode()))
+        self.pos += 1
+
+    def skip_string(self):
+        """Skip the string that starts at the current position"""
+
+        self.pos += 1
+        while True:
+            m = re_string_end.search(self.buf, self.pos)
+            if m == None or m.end() >= len(self.buf) and m.group() == b'\\':
+                # Need more input to see the end of the string or the escaped byte
+                self.pos = len(self.buf) if m == None else m.start()
+                if not self._more():
+                    raise self._error("Unterminated string")
+            elif m.group() == b'"':
+                self.pos = m.end()
+                return
+            else:
+                # Skip the backslash and the byte it escapes
+                self.pos = m.end() + 1
+
+    def skip_value(self):
+        """Skip the JSON value that starts at the current position"""
+
+        ch = self.peek()
+        if ch == b'"':
+            self.skip_string()
+        elif ch == b'[' or ch == b'{':
+            depth = 0
+            while True:
+                m = re_special.search(self.buf, self.pos)
+                if m == None:
+                    self.pos = len(self.buf)
+                    if not self._more():
+                        raise self._error("Unterminated list or object")
+                elif m.group() == b'"':
+                    self.pos = m.start()
+                    self.skip_string()
+                else:
+                    self.pos = m.end()
+                    if m.group() in (b'[', b'{'):
+                        depth += 1
+                    else:
+                        depth -= 1
+                        if depth == 0:
+                            return
+        elif ch == b"":
+            raise self._error("Unexpected end of file")
+        else:
+            # A number, true, false or null
+            while True:
+                m = re_scalar_end.search(self.buf, self.pos)
+                if m != None:
+                    self.pos = m.start()
+                    return
+                self.pos = len(self.buf)
+                if not self._more():
+                    return
+
+    def read_value(self):
+        """Decode and return the JSON value that starts at the current position"""
+
+        self.peek()
+        self.mark = self.pos
+        try:
+            self.skip_value()
+            return json.loads(self.buf[self.mark:self.pos].decode("utf-8"))
+        finally:
+            self.mark = None
+
+    def iter_object(self):
+        """Yield the keys of the object here: the caller must read or skip each value"""
+
+        self.expect(b'{')
+        if self.peek() == b'}':
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != b'"':
+                raise self._error("Expected a key")
+            key = self.read_value()
+            self.expect(b':')
+            yield key
+            ch = self.peek()
+            self.pos += 1
+            if ch == b'}':
+                return
+            elif ch != b',':
+                raise self._error("Expected , or }")
+
+    def count_array(self):
+        """Skip the list here and return the number of its items"""
+
+        self.expect(b'[')
+        if self.peek() == b']':
+            self.pos += 1
+            return 0
+        iCount = 0
+        while True:
+            self.skip_value()
+            iCount += 1
+            ch = self.peek()
+            self.pos += 1
+            if ch == b']':
+                return iCount
+            elif ch != b',':
+                raise self._error("Expected , or ]")
+
+    def iter_array(self):
+        """Yield the items of the list here, one at a time"""
+
+        self.expect(b'[')
+        if self.peek() == b']':
+            self.pos += 1
+            return
+        while True:
+            yield self.read_value()
+            ch = self.peek()
+            self.pos += 1
+            if ch == b']':
+                return
+            elif ch != b',':
+                raise self._error("Expected , or ]")
+
+
+class JsonColumns():
+    """The column lists of a BSCO JSON file, read incrementally
+
+    Use it like the dictionary that json.load() would return: jcInput[sheet]
+    is a generator for a sheet without header, and jcInput[sheet][column]
+    a generator for one of the columns of a sheet with a header.
+    """
+
+    def __init__(self, flInput, lStructure):
+        self.flInput = flInput
+        # Only the sheets and columns of the structure are indexed
+        self.oWanted = {}
+        for sheetobject in lStructure:
+            self.oWanted[sheetobject['name']] = sheetobject['header']
+        # Offset and length of each list, keyed by sheet name or (sheet name, column name)
+        self.oOffset = {}
+        self.oLength = {}
+        self.index()
+
+    def index(self):
+        """Find the offsets of all wanted column lists with one pass over the file"""
+
+        with io.open(self.flInput, "rb") as f:
+            scanner = ByteScanner(f)
+            # Allow for a byte order mark
+            if scanner.peek() == b'\xef':
+                scanner.pos += 3
+            for sheetName in scanner.iter_object():
+                lHeader = self.oWanted.get(sheetName)
+                if lHeader == None:
+                    scanner.skip_value()
+                elif len(lHeader) == 0:
+                    scanner.peek()
+                    self.oOffset[sheetName] = scanner.tell()
+                    self.oLength[sheetName] = scanner.count_array()
+                else:
+                    for colName in scanner.iter_object():
+                        if colName in lHeader:
+                            scanner.peek()
+                            self.oOffset[(sheetName, colName)] = scanner.tell()
+                            self.oLength[(sheetName, colName)] = scanner.count_array()
+                        else:
+                            scanner.skip_value()
+
+    def count_rows(self):
+        """Return the length of the longest column list"""
+
+        return max(self.oLength.values()) if len(self.oLength) > 0 else 0
+
+    def column(self, sheetName, colName=None):
+        """Yield the items of one column list"""
+
+        key = sheetName if colName == None else (sheetName, colName)
+        offset = self.oOffset[key]
+        with io.open(self.flInput, "rb") as f:
+            scanner = ByteScanner(f, offset)
+            for item in scanner.iter_array():
+                yield item
+
+    def __getitem__(self, sheetName):
+        if sheetName in self.oOffset:
+            return self.column(sheetName)
+        lHeader = self.oWanted.get(sheetName)
+        if not lHeader:
+            raise KeyError(sheetName)
+        return JsonSheet(self, sheetName)
+
+
+class JsonSheet():
+    """The columns of one sheet of a [JsonColumns]"""
+
+    def __init__(self, columns, sheetName):
+        self.columns = columns
+        self.sheetName = sheetName
+
+    def __getitem__(self, colName):
+        if (self.sheetName, colName) not in self.columns.oOffset:
+            raise KeyError(colName)
+        return self.columns.column(self.sheetName, colName)
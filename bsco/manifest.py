@@ -0,0 +1,63 @@
+"""Manifest of the downloaded CRMM files
+
+The manifest is a JSON file next to the _info.json output. It holds, per
+downloaded file, the URL it came from, a hash of the spreadsheet row, the
+ETag and Last-Modified validators of the reply, and the size and SHA-1 of
+the content. Sync mode uses it to send conditional requests.
+
+The manifest is saved every MANIFEST_SAVE_EVERY changes, or when a change
+comes MANIFEST_SAVE_SECONDS after the last save, so that an interrupted
+run keeps most of what it learned.
+
+"""
+import io
+import json
+import os
+import threading
+import time
+
+# Number of changed entries between two saves of the manifest
+MANIFEST_SAVE_EVERY = 100
+# Longest time in seconds that a change waits for a save
+MANIFEST_SAVE_SECONDS = 30
+
+
+class Manifest():
+    """Download state per file name, saved as JSON"""
+
+    def __init__(self, flManifest):
+        self.flManifest = flManifest
+        self.lock = threading.Lock()
+        self.oEntries = {}
+        if os.path.exists(flManifest):
+            with io.open(flManifest, "r", encoding="utf-8") as f:
+                self.oEntries = json.load(f)
+        self.iUnsaved = 0
+        self.fSaved = time.monotonic()
+
+    def get(self, sName):
+        with self.lock:
+            return self.oEntries.get(sName)
+
+    def set(self, sName, oEntry):
+        with self.lock:
+            self.oEntries[sName] = oEntry
+            self.iUnsaved += 1
+            if self.iUnsaved >= MANIFEST_SAVE_EVERY or time.monotonic() - self.fSaved >= MANIFEST_SAVE_SECONDS:
+                self.write()
+
+    def save(self):
+        with self.lock:
+            self.write()
+
+    def write(self):
+        """Write the manifest: replace the old one only when writing succeeded (the caller holds the lock)"""
+
+        sTemp = self.flManifest + ".part"
+        with io.open(sTemp, "w", encoding="utf-8") as f:
+            json.dump(self.oEntries, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(sTemp, self.flManifest)
+        self.iUnsaved = 0
+        self.fSaved = time.monotonic()
@@ -7,61 +7,170 @@ import os, os.path
 import sys
 import io
 import json
-import requests
+import codecs
+import hashlib
+import time
 
-from util import ErrHandle
+from util import ErrHandle, profiler
+
+# Connect and read timeout in seconds, so that a stalled connection cannot hang a download
+DEFAULT_TIMEOUT = (10, 60)
 
 def get_exc_message():
     exc_type, exc_value = sys.exc_info()[:2]
     sMsg = "Handling {} exception with message '{}'".format(exc_type.__name__, exc_value)
     return sMsg
 
-def downloadfile(url):
+def is_bad_url():
+    """Whether the exception being handled is about the URL itself, so that trying again cannot help"""
+
+    import requests
+    exc_type = sys.exc_info()[0]
+    return exc_type != None and issubclass(exc_type, (requests.exceptions.MissingSchema,
+                                                      requests.exceptions.InvalidSchema,
+                                                      requests.exceptions.InvalidURL))
+
+def get_retry_after(r):
+    """Return the delay in seconds that the Retry-After header of reply [r] asks for, if any"""
+
+    sValue = r.headers.get('Retry-After')
+    if not sValue:
+        return None
+    try:
+        return max(0.0, float(sValue))
+    except ValueError:
+        pass
+    try:
+        # An HTTP date instead of a number of seconds
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(sValue).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def downloadfile(url, session=None, timeout=None):
     """Downlaod a file from an URL to an (absolute) output file name"""
 
     # Default reply
     oBack = {}
+    if timeout == None: timeout = DEFAULT_TIMEOUT
     # Get the data from the URL
     try:
-        r = requests.get(url)
+        if session == None:
+            import requests
+            r = requests.get(url, timeout=timeout)
+        else:
+            r = session.get(url, timeout=timeout)
     except:
         oBack['status'] = "error"
         oBack['code'] = "Cannot download from {}\nError: {}".format(url, get_exc_message())
+        oBack['bad_url'] = is_bad_url()
         return oBack
     # Action depends on what we receive
     if r.status_code == 200:
         # Treat the reply as a complete string
         sText = r.text
+        profiler.count("bytes_downloaded", len(r.content))
         # Add the 'indices' separately
         oBack['text'] = sText
         oBack['status'] = 'ok'
+        oBack['elapsed'] = r.elapsed.total_seconds()
     else:
         oBack['status'] = 'error'
         oBack['code'] = r.status_code
+        oBack['retry_after'] = get_retry_after(r)
     # REturn what we have
     return oBack
 
+def downloadfile_to(url, target, session=None, timeout=None, headers=None, chunk_size=65536):
+    """Stream a file from an URL into the (absolute) output file name [target]
 
-class CrmmInfo():
+    The text is written in chunks to a temporary file next to [target], which
+    is only renamed to [target] once the download is complete. A reply of
+    304 to conditional [headers] gives status 'unchanged'.
+    """
 
-    line = ""
-    filenum = ""
-    mrg_name = ""
-    mrg_url = ""
-    meta_url = ""
-    location = ""
+    # Default reply
+    oBack = {}
+    if timeout == None: timeout = DEFAULT_TIMEOUT
+    # Get the data from the URL
+    try:
+        if session == None:
+            import requests
+            r = requests.get(url, timeout=timeout, headers=headers, stream=True)
+        else:
+            r = session.get(url, timeout=timeout, headers=headers, stream=True)
+    except:
+        oBack['status'] = "error"
+        oBack['code'] = "Cannot download from {}\nError: {}".format(url, get_exc_message())
+        oBack['bad_url'] = is_bad_url()
+        return oBack
+    sTemp = None
+    try:
+        # Action depends on what we receive
+        if r.status_code == 304:
+            profiler.count("files_unchanged")
+            oBack['status'] = 'unchanged'
+            oBack['code'] = r.status_code
+            oBack['elapsed'] = r.elapsed.total_seconds()
+            return oBack
+        elif r.status_code != 200:
+            oBack['status'] = 'error'
+            oBack['code'] = r.status_code
+            oBack['retry_after'] = get_retry_after(r)
+            return oBack
+        # Decode in the encoding of the reply, or else as UTF-8
+        decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="replace")
+        sTemp = target + ".part"
+        oHash = hashlib.sha1()
+        size = 0
+        with io.open(sTemp, "w", encoding="utf-8-sig") as f:
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                oHash.update(chunk)
+                size += len(chunk)
+                f.write(decoder.decode(chunk))
+            f.write(decoder.decode(b"", final=True))
+        os.replace(sTemp, target)
+        sTemp = None
+        profiler.count("files_downloaded")
+        profiler.count("bytes_downloaded", size)
+        oBack['status'] = 'ok'
+        # Validators for a later conditional request
+        oBack['etag'] = r.headers.get('ETag')
+        oBack['last_modified'] = r.headers.get('Last-Modified')
+        oBack['size'] = size
+        oBack['sha1'] = oHash.hexdigest()
+        # Time until the reply arrived, whatever the size of the file
+        oBack['elapsed'] = r.elapsed.total_seconds()
+    except:
+        oBack['status'] = "error"
+        oBack['code'] = "Cannot download from {}\nError: {}".format(url, get_exc_message())
+    finally:
+        r.close()
+        # Never leave a half-written file behind
+        if sTemp != None and os.path.exists(sTemp):
+            os.remove(sTemp)
+    # REturn what we have
+    return oBack
 
-    def __init__(self, *args, **kwargs):
-        """Create one item with information"""
 
-        # Copy the information in the KWARGS
-        for (k,v) in kwargs.items():
-            setattr(self, k, v)
+class CrmmInfo():
+    """Information on one row of the CRMM index"""
+
+    # Fixed attributes: no per-object dictionary
+    __slots__ = ('line', 'filenum', 'mrg_name', 'mrg_url', 'meta_url', 'location')
+
+    # One error handler for all objects
+    oErr = ErrHandle()
 
-        self.oErr = ErrHandle()
+    def __init__(self, line="", filenum="", mrg_name="", mrg_url="", meta_url="", location=""):
+        """Create one item with information"""
 
-        # perform other initialisations
-        super(CrmmInfo, self).__init__()
+        self.line = line
+        self.filenum = filenum
+        self.mrg_name = mrg_name
+        self.mrg_url = mrg_url
+        self.meta_url = meta_url
+        self.location = location
 
     def get_json(self):
         """Return a JSON object"""
@@ -78,28 +187,79 @@ class CrmmInfo():
             sMsg = self.oErr.get_error_message()
         return obj
  
-    def create_psd(self, targetdir):
+    def get_hash(self):
+        """Return a hash of the content of the spreadsheet row of this item
+
+        The line number is left out, so that inserting or deleting rows
+        above it in the index does not change the hash.
+        """
+
+        oRow = self.get_json()
+        del oRow['line']
+        sRow = json.dumps(oRow, sort_keys=True)
+        return hashlib.sha1(sRow.encode("utf-8")).hexdigest()
+
+    def exists(self, fTarget, store=None):
+        """Check if [fTarget] is already there: as a file, or in the [store]"""
+
+        if store == None:
+            return os.path.exists(fTarget)
+        return store.exists(os.path.basename(fTarget))
+
+    def sync(self, url, fTarget, download, manifest, store=None):
+        """Download [url] to [fTarget] only if it changed according to [manifest]"""
+
+        oBack = {}
+        sName = os.path.basename(fTarget)
+        sRow = self.get_hash()
+        oEntry = manifest.get(sName)
+        oHeaders = {}
+        if self.exists(fTarget, store) and oEntry != None and oEntry['url'] == url and oEntry['row'] == sRow:
+            # Only ask for the file if it changed upstream
+            if oEntry.get('etag'): oHeaders['If-None-Match'] = oEntry['etag']
+            if oEntry.get('last_modified'): oHeaders['If-Modified-Since'] = oEntry['last_modified']
+        self.oErr.Status("Synchronizing {}".format(fTarget))
+        oText = download(url, fTarget, headers=oHeaders)
+        if oText['status'] == "ok":
+            manifest.set(sName, {'url': url, 'row': sRow, 'etag': oText['etag'],
+                                 'last_modified': oText['last_modified'],
+                                 'size': oText['size'], 'sha1': oText['sha1']})
+            if store != None: store.put(sName, fTarget)
+            oBack['status'] = 'ok'
+        elif oText['status'] == "unchanged":
+            oBack['status'] = 'ok'
+        else:
+            oBack = oText
+        return oBack
+
+    def create_psd(self, targetdir, download=None, manifest=None, store=None):
         """Download the PSD from the link to the target directory"""
 
         oBack = {}
+        if download == None: download = downloadfile_to
+        if not self.mrg_url:
+            # Nothing to download from
+            oBack['status'] = "error"
+            oBack['msg'] = "No link to the PSD of file {}".format(self.filenum)
+            return oBack
 
         try:
 
             # Figure out how the target file name should be
             fTargetPsd = os.path.abspath(os.path.join(targetdir, "crmm_{}.psd".format(self.filenum)))
-            # Check if the file is already there
-            if os.path.exists(fTargetPsd):
+            # In sync mode the manifest decides, otherwise check if the file is already there
+            if manifest != None:
+                oBack = self.sync(self.mrg_url, fTargetPsd, download, manifest, store)
+            elif self.exists(fTargetPsd, store):
                 self.oErr.Status("Skipping {}".format(fTargetPsd))
                 oBack['status'] = 'ok'
             else:
                 self.oErr.Status("Downloading meta of {}".format(fTargetPsd))
                 # Get the text of the file
-                oText = downloadfile(self.mrg_url)
+                oText = download(self.mrg_url, fTargetPsd)
                 if oText['status'] == "ok":
-                    # Get and save the text
-                    sText = oText['text']
-                    with io.open(fTargetPsd, "w", encoding="utf-8-sig") as f:
-                        f.writelines(sText)
+                    # The text has been streamed into the target file
+                    if store != None: store.put(os.path.basename(fTargetPsd), fTargetPsd)
                     oBack['status'] = 'ok'
                 else:
                     # There is an error
@@ -110,27 +270,33 @@ class CrmmInfo():
             oBack['msg'] = sMsg
         return oBack
 
-    def create_meta(self, targetdir):
+    def create_meta(self, targetdir, download=None, manifest=None, store=None):
         """Download the metadata from the link to the target directory"""
 
         oBack = {}
+        if download == None: download = downloadfile_to
+        if not self.meta_url:
+            # Nothing to download from
+            oBack['status'] = "error"
+            oBack['msg'] = "No link to the metadata of file {}".format(self.filenum)
+            return oBack
 
         try:
             # Figure out how the target file name should be
             fTargetPsd = os.path.abspath(os.path.join(targetdir, "crmm_{}.meta.xml".format(self.filenum)))
-            # Check if the file is already there
-            if os.path.exists(fTargetPsd):
+            # In sync mode the manifest decides, otherwise check if the file is already there
+            if manifest != None:
+                oBack = self.sync(self.meta_url, fTargetPsd, download, manifest, store)
+            elif self.exists(fTargetPsd, store):
                 self.oErr.Status("Skipping {}".format(fTargetPsd))
                 oBack['status'] = 'ok'
             else:
                 # Get the text of the file
                 self.oErr.Status("Downloading meta of {}".format(fTargetPsd))
-                oText = downloadfile(self.meta_url)
+                oText = download(self.meta_url, fTargetPsd)
                 if oText['status'] == "ok":
-                    # Get and save the text
-                    sText = oText['text']
-                    with io.open(fTargetPsd, "w", encoding="utf-8-sig") as f:
-                        f.writelines(sText)
+                    # The text has been streamed into the target file
+                    if store != None: store.put(os.path.basename(fTargetPsd), fTargetPsd)
                     oBack['status'] = 'ok'
                 else:
                     # There is an error
@@ -0,0 +1,139 @@
+"""Columnar output formats for BSCO exports
+
+Besides the Excel workbook, a converted export can be written as CSV (one
+file per worksheet), as one SQLite database with a table per worksheet, or
+as Parquet (one file per worksheet, only when pyarrow is installed). All
+of them get their rows from columns.get_rows(), so they hold exactly the
+values the workbook would hold.
+
+"""
+import csv
+import io
+import sqlite3
+import sys
+
+# Imported by has_pyarrow(), only when the parquet output is used
+pyarrow = None
+
+# Number of rows written at a time
+BATCH_SIZE = 10000
+
+
+def has_pyarrow():
+    """Import pyarrow if it is installed: return True if it is"""
+
+    global pyarrow
+    if pyarrow == None:
+        try:
+            import pyarrow.parquet
+            pyarrow = sys.modules["pyarrow"]
+        except ImportError:
+            return False
+    return True
+
+
+class CsvOutput():
+    """One UTF-8 CSV file per worksheet: <base>_<title>.csv"""
+
+    extension = "csv"
+
+    def __init__(self, flBase):
+        self.flBase = flBase
+        self.lFiles = []
+
+    def write_sheet(self, sTitle, lNames, lRows):
+        flSheet = "{}_{}.csv".format(self.flBase, sTitle)
+        iRows = 0
+        with io.open(flSheet, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(lNames)
+            for tRow in lRows:
+                writer.writerow(tRow)
+                iRows += 1
+        self.lFiles.append(flSheet)
+        return iRows
+
+    def close(self):
+        return self.lFiles
+
+
+class SqliteOutput():
+    """One SQLite database with a table per worksheet: <base>.sqlite"""
+
+    extension = "sqlite"
+
+    def __init__(self, flBase):
+        self.flOutput = "{}.sqlite".format(flBase)
+        self.conn = sqlite3.connect(self.flOutput)
+
+    def write_sheet(self, sTitle, lNames, lRows):
+        sTable = quote(sTitle)
+        sColumns = ", ".join(quote(sName) for sName in lNames)
+        sValues = ", ".join("?" for sName in lNames)
+        iRows = 0
+        with self.conn:
+            self.conn.execute("DROP TABLE IF EXISTS {}".format(sTable))
+            # No column types: each value keeps its own type
+            self.conn.execute("CREATE TABLE {} ({})".format(sTable, sColumns))
+            sInsert = "INSERT INTO {} VALUES ({})".format(sTable, sValues)
+            lRows = iter(lRows)
+            while True:
+                lBatch = list(next_batch(lRows))
+                if len(lBatch) == 0:
+                    break
+                self.conn.executemany(sInsert, lBatch)
+                iRows += len(lBatch)
+        return iRows
+
+    def close(self):
+        self.conn.close()
+        return [self.flOutput]
+
+
+class ParquetOutput():
+    """One Parquet file per worksheet, all columns as strings: <base>_<title>.parquet"""
+
+    extension = "parquet"
+
+    def __init__(self, flBase):
+        if not has_pyarrow():
+            raise ImportError("The parquet output needs pyarrow")
+        self.flBase = flBase
+        self.lFiles = []
+
+    def write_sheet(self, sTitle, lNames, lRows):
+        flSheet = "{}_{}.parquet".format(self.flBase, sTitle)
+        schema = pyarrow.schema([(sName, pyarrow.string()) for sName in lNames])
+        iRows = 0
+        lRows = iter(lRows)
+        with pyarrow.parquet.ParquetWriter(flSheet, schema) as writer:
+            while True:
+                lBatch = list(next_batch(lRows))
+                if len(lBatch) == 0:
+                    break
+                # A column can mix strings and numbers: store them all as text
+                lArrays = [pyarrow.array([None if value is None else str(value) for value in lColumn], pyarrow.string())
+                           for lColumn in zip(*lBatch)]
+                writer.write_table(pyarrow.Table.from_arrays(lArrays, schema=schema))
+                iRows += len(lBatch)
+        self.lFiles.append(flSheet)
+        return iRows
+
+    def close(self):
+        return self.lFiles
+
+
+# The available output formats, besides "xlsx"
+OUTPUTS = {"csv": CsvOutput, "sqlite": SqliteOutput, "parquet": ParquetOutput}
+
+
+def quote(sName):
+    """Quote [sName] as an SQL identifier"""
+
+    return '"{}"'.format(sName.replace('"', '""'))
+
+def next_batch(lRows, iSize=BATCH_SIZE):
+    """Yield at most [iSize] rows of the iterator [lRows]"""
+
+    for idx, tRow in zip(range(iSize), lRows):
+        yield tRow
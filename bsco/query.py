@@ -0,0 +1,177 @@
+# ==========================================================================================================
+# Name :    query
+# Goal :    Look up records of a BSCO export through hash indexes
+# History:
+# 18/oct/2026    ERK Created
+# ==========================================================================================================
+import sys, getopt, os.path
+import util, json, io
+import sqlite3
+from columns import lStructure, get_sheet, get_rows
+
+# ============================= LOCAL VARIABLES ====================================
+errHandle = util.ErrHandle()
+# Fields that are indexed as soon as the records are loaded
+lIndexed = ["Owner.Name", "Owner.Location", "Auction.Year", "Auction.Location",
+            "Catalogue.Location", "Catalogue.Type", "Bookseller.Name"]
+
+
+class RecordStore():
+    """The sheets of a BSCO export, held as rows, with hash indexes on their fields
+
+    Row number i of each sheet belongs to the same record of the export, so
+    conditions on the fields of one sheet select rows of any other sheet.
+    Fields are named "Sheet.Column". Index keys are the values as text.
+    """
+
+    def __init__(self):
+        self.oSheet = {}    # Per sheet: {'names': [...], 'rows': [...]}
+        self.oIndex = {}    # Per field: {value as text: [row numbers]}
+
+    def load(self, flInput):
+        """Load the records of [flInput]: a BSCO JSON export or an SQLite output of bsco"""
+
+        if flInput.endswith(".sqlite"):
+            conn = sqlite3.connect(flInput)
+            try:
+                for sheetobject in lStructure:
+                    sheetName = sheetobject['name']
+                    cursor = conn.execute('SELECT * FROM "{}"'.format(sheetName))
+                    lNames = [col[0] for col in cursor.description]
+                    self.add_sheet(sheetName, lNames, cursor)
+            finally:
+                conn.close()
+        else:
+            with io.open(flInput, "r", encoding="utf-8") as f:
+                oInput = json.load(f)
+            for sheetobject in lStructure:
+                sheetName, lNames, lColumns = get_sheet(oInput, sheetobject)
+                self.add_sheet(sheetName, lNames, get_rows(lColumns))
+        for sField in lIndexed:
+            self.get_index(sField)
+        return self
+
+    def add_sheet(self, sheetName, lNames, lRows):
+        self.oSheet[sheetName] = {'names': list(lNames), 'rows': [tuple(tRow) for tRow in lRows]}
+
+    def get_index(self, sField):
+        """Get (and build if needed) the hash index of [sField]"""
+
+        oIndex = self.oIndex.get(sField)
+        if oIndex == None:
+            sheetName, sColumn = self.split_field(sField)
+            oSheet = self.oSheet[sheetName]
+            col = oSheet['names'].index(sColumn)
+            oIndex = {}
+            for row, tRow in enumerate(oSheet['rows']):
+                value = tRow[col]
+                if value is not None:
+                    oIndex.setdefault(str(value), []).append(row)
+            self.oIndex[sField] = oIndex
+        return oIndex
+
+    def split_field(self, sField):
+        """Split "Sheet.Column" into its sheet and column name"""
+
+        sheetName, sep, sColumn = sField.partition(".")
+        if sheetName not in self.oSheet:
+            raise KeyError("Unknown sheet in field: {}".format(sField))
+        if sep == "":
+            # A sheet without header has one column
+            sColumn = self.oSheet[sheetName]['names'][0]
+        return sheetName, sColumn
+
+    def lookup(self, oWhere):
+        """Return the sorted row numbers that match all conditions {field: value} of [oWhere]"""
+
+        # Start with the most selective condition
+        lMatch = sorted((self.get_index(sField).get(str(value), []) for sField, value in oWhere.items()), key=len)
+        if len(lMatch) == 0:
+            return []
+        elif len(lMatch) == 1:
+            # The index lists are already in row order
+            return list(lMatch[0])
+        lRows = lMatch[0]
+        for lOther in lMatch[1:]:
+            setOther = set(lOther)
+            lRows = [row for row in lRows if row in setOther]
+            if len(lRows) == 0:
+                break
+        return lRows
+
+    def select(self, sheetName, oWhere=None):
+        """Yield the rows of [sheetName] matching [oWhere] as dictionaries"""
+
+        oSheet = self.oSheet[sheetName]
+        lNames = oSheet['names']
+        lRows = oSheet['rows']
+        if oWhere:
+            lNumbers = self.lookup(oWhere)
+        else:
+            lNumbers = range(len(lRows))
+        for row in lNumbers:
+            if row < len(lRows):
+                yield dict(zip(lNames, lRows[row]))
+
+# ----------------------------------------------------------------------------------
+# Name :    main
+# Goal :    Main body of the function
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def main(prgName, argv) :
+  flInput = ''        # input JSON export or SQLite output
+  sSheet = ''         # sheet whose rows are shown
+  oWhere = {}         # conditions: field = value
+
+  try:
+    # Adapt the program name to exclude the directory
+    index = prgName.rfind("\\")
+    if (index > 0) :
+      prgName = prgName[index+1:]
+    sSyntax = prgName + ' -i <input file> -s <sheet> [-w <Sheet.Column>=<value>]...'
+    # get all the arguments
+    try:
+      # Get arguments and options
+      opts, args = getopt.getopt(argv, "hi:s:w:", ["input=","sheet=","where="])
+    except getopt.GetoptError:
+      print(sSyntax)
+      sys.exit(2)
+    # Walk all the arguments
+    for opt, arg in opts:
+      if opt in ("-h", "--help"):
+        print(sSyntax)
+        sys.exit(0)
+      elif opt in ("-i", "--input"):
+        flInput = arg
+      elif opt in ("-s", "--sheet"):
+        sSheet = arg
+      elif opt in ("-w", "--where"):
+        sField, sep, sValue = arg.partition("=")
+        oWhere[sField] = sValue
+    # Check if all arguments are there
+    if (flInput == '' or sSheet == ''):
+      errHandle.DoError(sSyntax)
+      return False
+    if not os.path.isfile(flInput):
+      errHandle.Status("Please specify an input FILE")
+      return False
+    # Load the records and show the rows that match
+    store = RecordStore().load(flInput)
+    iCount = 0
+    for oRow in store.select(sSheet, oWhere):
+      print(json.dumps(oRow, ensure_ascii=False))
+      iCount += 1
+    errHandle.Status("Rows: {}".format(iCount))
+    return True
+  except:
+    # act
+    errHandle.DoError("main")
+    return False
+
+# ----------------------------------------------------------------------------------
+# Goal :  If user calls this as main, then follow up on it
+# ----------------------------------------------------------------------------------
+if __name__ == "__main__":
+  # Call the main function with two arguments: program name + remainder
+  main(sys.argv[0], sys.argv[1:])
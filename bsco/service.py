@@ -0,0 +1,354 @@
+# ==========================================================================================================
+# Name :    service
+# Goal :    Keep the BSCO and CRMM tools running as a local service
+#           Jobs come in over HTTP on localhost and go to a pool of worker processes that
+#           have loaded the tools, openpyxl and requests before the first job arrives:
+#               POST /jobs          submit a job, e.g. {"command": "bsco convert", "args": {"input": ..., "output": ...}}
+#               GET  /jobs          the status of all jobs
+#               GET  /jobs/<id>     the status, result and metrics of one job
+#               GET  /metrics       the counts and timings of the service as a whole
+#           The "args" of a job are the oArgs of process_bsco() or process_crmm().
+# History:
+# 18/oct/2026    ERK Created
+# ==========================================================================================================
+import sys, getopt
+import util, json, io
+import contextlib
+import threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+# concurrent.futures is slow to load: it is imported by the function that needs it
+
+# ============================= LOCAL VARIABLES ====================================
+errHandle = util.ErrHandle()
+# Number of status lines of a job that are kept
+LOG_LINES = 50
+# Number of finished jobs that are kept
+MAX_JOBS = 1000
+# The service takes jobs from anyone who can reach it: only listen on this computer
+HOST = '127.0.0.1'
+
+
+def run_bsco(oArgs):
+    import bsco
+    oArgs = dict({'method': 'compact'}, **oArgs)
+    if bsco.is_batch(oArgs.get('input', '')):
+        return bsco.process_batch(oArgs), None
+    bOkay = bsco.process_bsco(oArgs)
+    if bOkay: util.profiler.count("rows_written", oArgs.get('rows', 0))
+    return bOkay, oArgs.get('rows')
+
+def run_crmm(oArgs):
+    import crmm
+    return crmm.process_crmm(oArgs), None
+
+def run_crmm_index(oArgs):
+    import crmm
+    return crmm.process_crmm(dict(oArgs, download=False)), None
+
+def run_validate(oArgs):
+    import validate, storage
+    store = storage.get_store(oArgs['input'])
+    try:
+        lInvalid = validate.validate_dir(oArgs['input'], store, oArgs.get('output'))
+    finally:
+        store.close()
+    return len(lInvalid) == 0, None
+
+# Per command: the function that runs it in a worker
+oCommands = {
+    "bsco convert":     run_bsco,
+    "crmm fetch":       run_crmm,
+    "crmm index":       run_crmm_index,
+    "crmm validate":    run_validate,
+}
+
+def warm_up():
+    """Load everything a job needs, once per worker process"""
+
+    import bsco, crmm, validate, storage, downloader
+    import openpyxl, requests
+    # The first workbook loads the default styles
+    openpyxl.Workbook()
+
+def ping():
+    return True
+
+def run_job(sCommand, oArgs):
+    """Run one job in a worker: return its outcome, status lines and metrics"""
+
+    fStarted = time.time()
+    util.profiler.reset()
+    fLog = io.StringIO()
+    oBack = {'started': fStarted, 'status': "failed", 'rows': None}
+    with contextlib.redirect_stderr(fLog):
+        try:
+            bOkay, oBack['rows'] = oCommands[sCommand](oArgs)
+            if bOkay: oBack['status'] = "done"
+        except:
+            errHandle.DoError("run_job")
+    oBack['finished'] = time.time()
+    oBack['log'] = fLog.getvalue().splitlines()[-LOG_LINES:]
+    oBack['metrics'] = util.profiler.get_report()
+    return oBack
+
+
+class JobService():
+    """Queue the jobs on a pool of [workers] warm processes and keep track of them"""
+
+    def __init__(self, workers=2):
+        self.workers = max(1, workers)
+        self.executor = None
+        self.restarts = 0
+        self.pool_lock = threading.Lock()
+        self.start_pool()
+        self.oJobs = {}
+        self.iLast = 0
+        self.fStart = time.time()
+        self.lock = threading.Lock()
+
+    def start_pool(self):
+        """Start a pool of warm workers (the caller holds the pool lock, or is __init__)"""
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up)
+        # Start all workers now, not when the first jobs arrive
+        for future in [self.executor.submit(ping) for idx in range(self.workers)]:
+            future.result()
+
+    def restart(self, executor):
+        """Replace the pool [executor], broken by a worker that died, unless that happened already"""
+
+        with self.pool_lock:
+            if self.executor is executor:
+                errHandle.Status("A worker died: starting the workers again")
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.restarts += 1
+                self.start_pool()
+
+    def submit(self, sCommand, oArgs):
+        """Queue a job: return its id
+
+        A pool with a dead worker takes no jobs: it is then started again,
+        once. If that does not help, the exception goes to the caller.
+        """
+
+        from concurrent.futures.process import BrokenProcessPool
+
+        with self.lock:
+            self.iLast += 1
+            oJob = {'id': self.iLast, 'command': sCommand, 'args': oArgs,
+                    'submitted': time.time(), 'future': None}
+            self.oJobs[oJob['id']] = oJob
+            self.forget()
+        try:
+            try:
+                executor = self.executor
+                oJob['future'] = executor.submit(run_job, sCommand, oArgs)
+            except BrokenProcessPool:
+                self.restart(executor)
+                oJob['future'] = self.executor.submit(run_job, sCommand, oArgs)
+        except:
+            with self.lock:
+                self.oJobs.pop(oJob['id'], None)
+            raise
+        return oJob['id']
+
+    def forget(self):
+        """Drop the oldest finished jobs beyond MAX_JOBS (the caller holds the lock)"""
+
+        lFinished = [oJob['id'] for oJob in self.oJobs.values() if oJob['future'] != None and oJob['future'].done()]
+        for id in lFinished[:max(0, len(lFinished) - MAX_JOBS)]:
+            del self.oJobs[id]
+
+    def get_job(self, id, bDetails=True):
+        """Return the status of job [id] as a dictionary, or None"""
+
+        with self.lock:
+            oJob = self.oJobs.get(id)
+        if oJob == None:
+            return None
+        oBack = {'id': oJob['id'], 'command': oJob['command'], 'status': "queued"}
+        future = oJob['future']
+        if future == None:
+            pass
+        elif future.done():
+            if future.exception() != None:
+                oResult = {'status': "failed", 'log': [repr(future.exception())]}
+            else:
+                oResult = future.result()
+            oBack['status'] = oResult['status']
+            if 'started' in oResult:
+                oBack['wait'] = round(oResult['started'] - oJob['submitted'], 3)
+                oBack['seconds'] = round(oResult['finished'] - oResult['started'], 3)
+                oBack['rows'] = oResult['rows']
+            if bDetails:
+                oBack['log'] = oResult['log']
+                oBack['metrics'] = oResult.get('metrics')
+        elif future.running():
+            oBack['status'] = "running"
+        if bDetails:
+            oBack['args'] = oJob['args']
+            oBack['submitted'] = oJob['submitted']
+        return oBack
+
+    def get_jobs(self):
+        with self.lock:
+            lIds = sorted(self.oJobs)
+        return [oJob for oJob in (self.get_job(id, False) for id in lIds) if oJob != None]
+
+    def get_metrics(self):
+        """Return the counts and timings of all jobs that are kept"""
+
+        oStatus = {}
+        oCounters = {}
+        fWait = 0.0
+        fSeconds = 0.0
+        iTimed = 0
+        with self.lock:
+            lJobs = list(self.oJobs.values())
+        for oJob in lJobs:
+            future = oJob['future']
+            oBack = self.get_job(oJob['id'], False)
+            if oBack == None:
+                # Forgotten in the meantime
+                continue
+            oStatus[oBack['status']] = oStatus.get(oBack['status'], 0) + 1
+            if 'seconds' in oBack:
+                iTimed += 1
+                fWait += oBack['wait']
+                fSeconds += oBack['seconds']
+                for sName, iCount in future.result()['metrics']['counters'].items():
+                    oCounters[sName] = oCounters.get(sName, 0) + iCount
+        return {'workers': self.workers,
+                'restarts': self.restarts,
+                'uptime': round(time.time() - self.fStart, 3),
+                'submitted': self.iLast,
+                'jobs': oStatus,
+                'wait_avg': round(fWait / iTimed, 3) if iTimed > 0 else None,
+                'seconds_avg': round(fSeconds / iTimed, 3) if iTimed > 0 else None,
+                'seconds_total': round(fSeconds, 3),
+                'counters': oCounters}
+
+    def close(self):
+        with self.pool_lock:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """The HTTP interface to the JobService of the server"""
+
+    def send_json(self, code, oData):
+        bData = json.dumps(oData, indent=2).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(bData)))
+        self.end_headers()
+        self.wfile.write(bData)
+
+    def do_GET(self):
+        service = self.server.service
+        lPath = self.path.strip("/").split("/")
+        if lPath == ["metrics"]:
+            self.send_json(200, service.get_metrics())
+        elif lPath == ["jobs"]:
+            self.send_json(200, service.get_jobs())
+        elif len(lPath) == 2 and lPath[0] == "jobs" and lPath[1].isdigit():
+            oJob = service.get_job(int(lPath[1]))
+            if oJob == None:
+                self.send_json(404, {'error': "No job {}".format(lPath[1])})
+            else:
+                self.send_json(200, oJob)
+        else:
+            self.send_json(404, {'error': "Unknown path {}".format(self.path)})
+
+    def do_POST(self):
+        if self.path.strip("/") != "jobs":
+            self.send_json(404, {'error': "Unknown path {}".format(self.path)})
+            return
+        try:
+            iLength = int(self.headers.get("Content-Length", 0))
+            oRequest = json.loads(self.rfile.read(iLength).decode("utf-8"))
+            sCommand = oRequest['command']
+            oArgs = oRequest.get('args', {})
+        except:
+            self.send_json(400, {'error': 'Expected {"command": ..., "args": {...}}'})
+            return
+        if sCommand not in oCommands:
+            self.send_json(400, {'error': "Unknown command {}, use one of: {}".format(
+                sCommand, ", ".join(sorted(oCommands)))})
+        elif not isinstance(oArgs, dict) or 'input' not in oArgs:
+            self.send_json(400, {'error': "The args need at least an input"})
+        else:
+            try:
+                id = self.server.service.submit(sCommand, oArgs)
+            except:
+                errHandle.DoError("do_POST")
+                self.send_json(503, {'error': "The workers cannot take jobs: {}".format(errHandle.get_error_message())})
+                return
+            self.send_json(202, {'id': id, 'status': "queued"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+# ----------------------------------------------------------------------------------
+# Name :    main
+# Goal :    Main body of the function
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def main(prgName, argv) :
+  iPort = 8642        # Port to listen on
+  iWorkers = 2        # Number of worker processes
+
+  try:
+    # Adapt the program name to exclude the directory
+    index = prgName.rfind("\\")
+    if (index > 0) :
+      prgName = prgName[index+1:]
+    sSyntax = prgName + ' [-p <port>] [-w <workers>]'
+    # get all the arguments
+    try:
+      # Get arguments and options
+      opts, args = getopt.getopt(argv, "hp:w:", ["port=","workers="])
+    except getopt.GetoptError:
+      print(sSyntax)
+      sys.exit(2)
+    # Walk all the arguments
+    for opt, arg in opts:
+      if opt in ("-h", "--help"):
+        print(sSyntax)
+        sys.exit(0)
+      elif opt in ("-p", "--port"):
+        iPort = int(arg)
+      elif opt in ("-w", "--workers"):
+        iWorkers = int(arg)
+    # Start the workers, then take jobs
+    errHandle.Status('Starting {} workers'.format(iWorkers))
+    service = JobService(iWorkers)
+    server = ServiceServer((HOST, iPort), ServiceHandler)
+    server.service = service
+    errHandle.Status('Listening on http://{}:{}'.format(HOST, server.server_address[1]))
+    try:
+      server.serve_forever()
+    except KeyboardInterrupt:
+      errHandle.Status("Stopping")
+    finally:
+      server.server_close()
+      service.close()
+    return True
+  except:
+    # act
+    errHandle.DoError("main")
+    return False
+
+# ----------------------------------------------------------------------------------
+# Goal :  If user calls this as main, then follow up on it
+# ----------------------------------------------------------------------------------
+if __name__ == "__main__":
+  # Call the main function with two arguments: program name + remainder
+  main(sys.argv[0], sys.argv[1:])
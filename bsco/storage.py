@@ -0,0 +1,313 @@
+"""Storage of the downloaded CRMM files
+
+The .psd and .meta.xml files of the CRMM reader are downloaded as plain
+text files into the output directory. A store decides what happens to
+them next:
+
+    plain   they stay as they are
+    gzip    each file is compressed into <name>.gz
+    zstd    each file is compressed into <name>.zst (only when zstandard is installed)
+    pack    all files go into one archive, crmm_pack.dat, with an index in
+            crmm_pack.json; files with identical content are stored once
+
+Each file can be read back on its own, also from the archive: the index
+gives the offset and length of its compressed content.
+
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys, getopt
+import threading
+import zlib
+
+from util import ErrHandle
+
+# Imported by has_zstandard(), only when the zstd storage is used
+zstandard = None
+
+errHandle = ErrHandle()
+# Number of files added to the archive between two saves of its index
+PACK_SAVE_EVERY = 100
+
+
+def has_zstandard():
+    """Import zstandard if it is installed: return True if it is"""
+
+    global zstandard
+    if zstandard == None:
+        try:
+            import zstandard
+        except ImportError:
+            return False
+    return True
+
+
+class PlainStore():
+    """Leave the downloaded files as they are"""
+
+    def __init__(self, dirOutput):
+        self.dirOutput = dirOutput
+
+    def get_path(self, sName):
+        return os.path.join(self.dirOutput, sName)
+
+    def exists(self, sName):
+        return os.path.exists(self.get_path(sName))
+
+    def put(self, sName, flFile):
+        """Take the downloaded file [flFile] into the store as [sName]"""
+        pass
+
+    def read(self, sName):
+        with io.open(self.get_path(sName), "rb") as f:
+            return f.read()
+
+    def open(self, sName):
+        """Open [sName] for reading as a binary file"""
+        return io.open(self.get_path(sName), "rb")
+
+    def remove(self, sName):
+        if self.exists(sName):
+            os.remove(self.get_path(sName))
+
+    def names(self):
+        return sorted(sName for sName in os.listdir(self.dirOutput)
+                      if sName.startswith("crmm_") and not sName.endswith(".part"))
+
+    def close(self):
+        pass
+
+
+class CompressedStore(PlainStore):
+    """Replace each downloaded file by a compressed copy: <name><suffix>"""
+
+    suffix = ""
+
+    def get_path(self, sName):
+        return os.path.join(self.dirOutput, sName + self.suffix)
+
+    def put(self, sName, flFile):
+        flTarget = self.get_path(sName)
+        sTemp = flTarget + ".part"
+        with io.open(flFile, "rb") as fIn, io.open(sTemp, "wb") as fOut:
+            self.compress(fIn, fOut)
+        os.replace(sTemp, flTarget)
+        os.remove(flFile)
+
+    def read(self, sName):
+        with io.open(self.get_path(sName), "rb") as f:
+            return self.decompress(f)
+
+    def names(self):
+        return sorted(sName[:-len(self.suffix)] for sName in os.listdir(self.dirOutput)
+                      if sName.startswith("crmm_") and sName.endswith(self.suffix))
+
+
+class GzipStore(CompressedStore):
+    suffix = ".gz"
+
+    def compress(self, fIn, fOut):
+        # No time stamp, so that the same content gives the same bytes
+        with gzip.GzipFile(filename="", mode="wb", fileobj=fOut, mtime=0) as fZip:
+            shutil.copyfileobj(fIn, fZip)
+
+    def decompress(self, f):
+        with gzip.GzipFile(fileobj=f, mode="rb") as fZip:
+            return fZip.read()
+
+    def open(self, sName):
+        return gzip.open(self.get_path(sName), "rb")
+
+
+class ZstdStore(CompressedStore):
+    suffix = ".zst"
+
+    def __init__(self, dirOutput):
+        if not has_zstandard():
+            raise ImportError("The zstd storage needs zstandard")
+        super().__init__(dirOutput)
+
+    def compress(self, fIn, fOut):
+        zstandard.ZstdCompressor(level=10).copy_stream(fIn, fOut)
+
+    def decompress(self, f):
+        with zstandard.ZstdDecompressor().stream_reader(f) as reader:
+            return reader.read()
+
+    def open(self, sName):
+        return io.BytesIO(self.read(sName))
+
+
+class PackStore():
+    """All files in one archive of zlib-compressed blobs, keyed by the SHA-1 of their content
+
+    The index holds per file name the hash of its content, and per hash the
+    offset and length of the blob in the archive and the original size.
+    Blobs are only appended; the index is replaced as a whole, after the
+    blobs it points to are on disk.
+    """
+
+    def __init__(self, dirOutput):
+        self.dirOutput = dirOutput
+        self.flData = os.path.join(dirOutput, "crmm_pack.dat")
+        self.flIndex = os.path.join(dirOutput, "crmm_pack.json")
+        self.lock = threading.Lock()
+        self.oIndex = {'files': {}, 'blobs': {}}
+        if os.path.exists(self.flIndex):
+            with io.open(self.flIndex, "r", encoding="utf-8") as f:
+                self.oIndex = json.load(f)
+        self.fData = None
+        self.iUnsaved = 0
+
+    def exists(self, sName):
+        with self.lock:
+            return sName in self.oIndex['files']
+
+    def put(self, sName, flFile):
+        with io.open(flFile, "rb") as f:
+            bData = f.read()
+        sHash = hashlib.sha1(bData).hexdigest()
+        with self.lock:
+            if sHash not in self.oIndex['blobs']:
+                if self.fData == None:
+                    self.fData = io.open(self.flData, "ab")
+                bBlob = zlib.compress(bData, 6)
+                self.fData.seek(0, os.SEEK_END)
+                offset = self.fData.tell()
+                self.fData.write(bBlob)
+                self.oIndex['blobs'][sHash] = [offset, len(bBlob), len(bData)]
+            self.oIndex['files'][sName] = sHash
+            self.iUnsaved += 1
+            if self.iUnsaved >= PACK_SAVE_EVERY:
+                self.save()
+        os.remove(flFile)
+
+    def save(self):
+        """Write the index (the caller holds the lock)"""
+
+        if self.fData != None:
+            self.fData.flush()
+            os.fsync(self.fData.fileno())
+        sTemp = self.flIndex + ".part"
+        with io.open(sTemp, "w", encoding="utf-8") as f:
+            json.dump(self.oIndex, f)
+        os.replace(sTemp, self.flIndex)
+        self.iUnsaved = 0
+
+    def read(self, sName):
+        with self.lock:
+            offset, length, size = self.oIndex['blobs'][self.oIndex['files'][sName]]
+            if self.fData != None:
+                self.fData.flush()
+        with io.open(self.flData, "rb") as f:
+            f.seek(offset)
+            return zlib.decompress(f.read(length))
+
+    def open(self, sName):
+        return io.BytesIO(self.read(sName))
+
+    def remove(self, sName):
+        """Drop [sName] from the index: its blob stays, as other files may share it"""
+
+        with self.lock:
+            if sName in self.oIndex['files']:
+                del self.oIndex['files'][sName]
+                self.iUnsaved += 1
+
+    def names(self):
+        with self.lock:
+            return sorted(self.oIndex['files'])
+
+    def close(self):
+        with self.lock:
+            if self.iUnsaved > 0:
+                self.save()
+            if self.fData != None:
+                self.fData.close()
+                self.fData = None
+
+
+STORES = {"plain": PlainStore, "gzip": GzipStore, "zstd": ZstdStore, "pack": PackStore}
+
+def get_store(dirOutput):
+    """Return the store that holds the files of [dirOutput]"""
+
+    if os.path.exists(os.path.join(dirOutput, "crmm_pack.json")):
+        return PackStore(dirOutput)
+    for sName in os.listdir(dirOutput):
+        if sName.startswith("crmm_"):
+            if sName.endswith(".zst"):
+                return ZstdStore(dirOutput)
+            elif sName.endswith(".gz"):
+                return GzipStore(dirOutput)
+    return PlainStore(dirOutput)
+
+# ----------------------------------------------------------------------------------
+# Name :    main
+# Goal :    List or extract the files of a CRMM output directory
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def main(prgName, argv) :
+  dirInput = ''       # CRMM output directory
+  lExtract = []       # Names of the files to extract
+  dirOutput = ''      # Where extracted files go (default: standard output)
+
+  try:
+    # Adapt the program name to exclude the directory
+    index = prgName.rfind("\\")
+    if (index > 0) :
+      prgName = prgName[index+1:]
+    sSyntax = prgName + ' -i <CRMM output directory> [-x <file name>]... [-o <directory>]'
+    # get all the arguments
+    try:
+      # Get arguments and options
+      opts, args = getopt.getopt(argv, "hi:x:o:", ["input=","extract=","output="])
+    except getopt.GetoptError:
+      print(sSyntax)
+      sys.exit(2)
+    # Walk all the arguments
+    for opt, arg in opts:
+      if opt in ("-h", "--help"):
+        print(sSyntax)
+        sys.exit(0)
+      elif opt in ("-i", "--input"):
+        dirInput = arg
+      elif opt in ("-x", "--extract"):
+        lExtract.append(arg)
+      elif opt in ("-o", "--output"):
+        dirOutput = arg
+    if dirInput == '' or not os.path.isdir(dirInput):
+      print(sSyntax)
+      return False
+    store = get_store(dirInput)
+    try:
+      if len(lExtract) == 0:
+        # Only list what is there
+        for sName in store.names():
+          print(sName)
+      for sName in lExtract:
+        bData = store.read(sName)
+        if dirOutput == '':
+          sys.stdout.buffer.write(bData)
+        else:
+          with io.open(os.path.join(dirOutput, sName), "wb") as f:
+            f.write(bData)
+    finally:
+      store.close()
+    return True
+  except:
+    # act
+    errHandle.DoError("main")
+    return False
+
+# ----------------------------------------------------------------------------------
+# Goal :  If user calls this as main, then follow up on it
+# ----------------------------------------------------------------------------------
+if __name__ == "__main__":
+  # Call the main function with two arguments: program name + remainder
+  main(sys.argv[0], sys.argv[1:])
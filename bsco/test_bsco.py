@@ -0,0 +1,118 @@
+"""The conversion of BSCO exports"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import openpyxl
+
+import benchmark
+import bsco
+from columns import lStructure
+from test_xlsxparts import lValues, make_input
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirTemp = tempfile.mkdtemp(prefix="bsco_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.dirTemp)
+
+    def convert(self, oArgs):
+        with contextlib.redirect_stderr(io.StringIO()):
+            if bsco.is_batch(oArgs['input']):
+                return bsco.process_batch(oArgs)
+            return bsco.process_bsco(oArgs)
+
+    def test_is_batch(self):
+        flInput = benchmark.make_bsco(os.path.join(self.dirTemp, "export[1].json"), 5)
+        # A file is one input, whatever its name
+        self.assertFalse(bsco.is_batch(flInput))
+        self.assertTrue(bsco.is_batch(self.dirTemp))
+        self.assertTrue(bsco.is_batch(os.path.join(self.dirTemp, "*.json")))
+        self.assertFalse(bsco.is_batch(os.path.join(self.dirTemp, "missing.json")))
+
+    def test_file_with_brackets(self):
+        flInput = benchmark.make_bsco(os.path.join(self.dirTemp, "export[1].json"), 5)
+        flOutput = os.path.join(self.dirTemp, "out.xlsx")
+        self.assertTrue(self.convert({'input': flInput, 'output': flOutput, 'method': "compact"}))
+        self.assertTrue(os.path.exists(os.path.join(self.dirTemp, "out_compact.xlsx")))
+
+    def test_batch(self):
+        dirInput = os.path.join(self.dirTemp, "in")
+        os.mkdir(dirInput)
+        for idx in range(3):
+            benchmark.make_bsco(os.path.join(dirInput, "export{}.json".format(idx)), 5, idx)
+        dirOutput = os.path.join(self.dirTemp, "out")
+        self.assertTrue(self.convert({'input': dirInput, 'output': dirOutput, 'method': "compact", 'jobs': 2}))
+        self.assertEqual(sorted(os.listdir(dirOutput)),
+                         ["export{}_compact.xlsx".format(idx) for idx in range(3)])
+
+
+def read_cells(flOutput):
+    """Return the cells that [flOutput] has per sheet: (value, type, style) by (row, column)"""
+
+    wb = openpyxl.load_workbook(flOutput)
+    oSheets = {}
+    for ws in wb.worksheets:
+        oSheets[ws.title] = {key: (c.value, c.data_type, c.style) for key, c in ws._cells.items()}
+    return oSheets
+
+
+class LayoutTest(unittest.TestCase):
+    """The engines and the methods give the same cells, also for columns of different lengths"""
+
+    def setUp(self):
+        self.dirTemp = tempfile.mkdtemp(prefix="bsco_test_")
+        self.flInput = os.path.join(self.dirTemp, "input.json")
+        with io.open(self.flInput, "w", encoding="utf-8") as f:
+            json.dump(make_input(lValues), f)
+
+    def tearDown(self):
+        shutil.rmtree(self.dirTemp)
+
+    def convert(self, sName, sMethod, **oOptions):
+        oArgs = dict({'input': self.flInput, 'output': os.path.join(self.dirTemp, sName + ".xlsx"),
+                      'method': sMethod}, **oOptions)
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertTrue(bsco.process_bsco(oArgs))
+        return {sOne: read_cells(os.path.join(self.dirTemp, "{}_{}.xlsx".format(sName, sOne)))
+                for sOne in sMethod.split(",")}
+
+    def test_engines(self):
+        for sMethod in ("compact", "full"):
+            oCell = self.convert("cell", sMethod)[sMethod]
+            oStream = self.convert("stream", sMethod, engine="stream")[sMethod]
+            self.assertEqual(oStream, oCell, sMethod)
+
+    def test_ragged(self):
+        oSheet = self.convert("cell", "compact")["compact"]["Compact"]
+        oStream = self.convert("stream", "compact", engine="stream")["compact"]["Compact"]
+        self.assertEqual(oStream, oSheet)
+        oInput = make_input(lValues)
+        lLengths = [len(oInput["Documents"])] + [len(oInput[sheetobject['name']][colName])
+                                                 for sheetobject in lStructure for colName in sheetobject['header']]
+        self.assertGreater(len(set(lLengths)), 1)
+        for col, iLength in enumerate(lLengths, 1):
+            # The last value of a column is there, even if empty, and an ended column has no cells
+            self.assertIn((iLength + 1, col), oSheet)
+            self.assertNotIn((iLength + 2, col), oSheet)
+        # An empty value is an empty cell, styled like its neighbours
+        row = 1 + lValues.index([None]) + 1
+        self.assertIsNone(oSheet[(row, 1)][0])
+        self.assertEqual(oSheet[(row, 1)][2], "bsco_cell")
+
+    def test_methods_at_once(self):
+        for oOptions in ({}, {'engine': "stream"}, {'reader': "stream"}, {'cache': os.path.join(self.dirTemp, "cache")}):
+            oTogether = self.convert("together", "compact,full", **oOptions)
+            oSeparate = dict(self.convert("compact", "compact", **oOptions), **self.convert("full", "full", **oOptions))
+            self.assertEqual(oTogether, oSeparate, oOptions)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+"""The on-disk cache of normalized input, also when shared by several processes"""
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import unittest
+
+import benchmark
+from cache import EXTENSION, InputCache
+from columns import NormalizedColumn, lStructure, normalize_input
+
+
+def write_entries(dirCache, iWriter, oBack):
+    """Store and read entries in a small cache that other writers share"""
+
+    try:
+        oCache = InputCache(dirCache, iMaxSize=20000)
+        for idx in range(40):
+            oCache.put("w{}_{}".format(iWriter, idx % 5), ["x" * 1000] * (1 + idx % 7))
+            oCache.get("w{}_{}".format((iWriter + 1) % 8, idx % 5))
+            oCache.evict()
+    except BaseException as e:
+        oBack[iWriter] = repr(e)
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirTemp = tempfile.mkdtemp(prefix="bsco_test_")
+        self.dirCache = os.path.join(self.dirTemp, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.dirTemp)
+
+    def entries(self):
+        return sorted(sName[:-len(EXTENSION)] for sName in os.listdir(self.dirCache) if sName.endswith(EXTENSION))
+
+    def age(self, oCache, sKey, iSeconds):
+        fTime = time.time() - iSeconds
+        os.utime(oCache.get_file(sKey), (fTime, fTime))
+
+    def test_key(self):
+        flInput = benchmark.make_bsco(os.path.join(self.dirTemp, "input.json"), 5)
+        oCache = InputCache(self.dirCache)
+        sKey = oCache.get_key(flInput)
+        self.assertEqual(oCache.get_key(flInput), sKey)
+        # Touched only
+        os.utime(flInput, ns=(0, os.stat(flInput).st_mtime_ns + 1000))
+        sTouched = oCache.get_key(flInput)
+        self.assertNotEqual(sTouched, sKey)
+        # Same size and time, other content
+        oStat = os.stat(flInput)
+        with io.open(flInput, "r+b") as f:
+            f.seek(-2, os.SEEK_END)
+            bLast = f.read(2)
+            f.seek(-2, os.SEEK_END)
+            f.write(bLast[::-1] if bLast[0] != bLast[1] else b"  ")
+        os.utime(flInput, ns=(oStat.st_atime_ns, oStat.st_mtime_ns))
+        self.assertNotEqual(oCache.get_key(flInput), sTouched)
+
+    def test_normalized(self):
+        flInput = benchmark.make_bsco(os.path.join(self.dirTemp, "input.json"), 20)
+        with io.open(flInput, "r", encoding="utf-8") as f:
+            oNormal = normalize_input(json.load(f))
+        oCache = InputCache(self.dirCache)
+        oCache.put("input", oNormal)
+        oBack = oCache.get("input")
+        self.assertEqual(oBack, oNormal)
+        for sheetobject in lStructure:
+            if len(sheetobject['header']) == 0:
+                self.assertIsInstance(oBack[sheetobject['name']], NormalizedColumn)
+            else:
+                for colName in sheetobject['header']:
+                    self.assertIsInstance(oBack[sheetobject['name']][colName], NormalizedColumn)
+
+    def test_damaged(self):
+        oCache = InputCache(self.dirCache)
+        with io.open(oCache.get_file("bad"), "wb") as f:
+            f.write(b"not a pickle")
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertIsNone(oCache.get("bad"))
+        self.assertEqual(self.entries(), [])
+        self.assertIsNone(oCache.get("missing"))
+
+    def test_lru(self):
+        iSize = len(pickle.dumps(["x" * 1000], protocol=pickle.HIGHEST_PROTOCOL))
+        oCache = InputCache(self.dirCache, iMaxSize=2 * iSize)
+        oCache.put("c", ["x" * 1000])
+        self.age(oCache, "c", 30)
+        oCache.put("b", ["x" * 1000])
+        self.age(oCache, "b", 20)
+        oCache.put("a", ["x" * 1000])
+        # The least recently used goes
+        self.assertEqual(self.entries(), ["a", "b"])
+        self.age(oCache, "a", 10)
+        # Reading "b" makes it the most recently used
+        self.assertIsNotNone(oCache.get("b"))
+        oCache.put("d", ["x" * 1000])
+        self.assertEqual(self.entries(), ["b", "d"])
+
+    def test_age(self):
+        oCache = InputCache(self.dirCache, iMaxAge=60)
+        oCache.put("old", [1])
+        oCache.put("new", [2])
+        self.age(oCache, "old", 120)
+        oCache.evict()
+        self.assertEqual(self.entries(), ["new"])
+
+    def test_newest_kept(self):
+        oCache = InputCache(self.dirCache, iMaxSize=100)
+        oCache.put("small", [1])
+        oCache.put("large", ["x" * 1000])
+        self.assertEqual(self.entries(), ["large"])
+        self.assertEqual(oCache.get("large"), ["x" * 1000])
+
+    def test_shared(self):
+        with multiprocessing.Manager() as manager:
+            oBack = manager.dict()
+            lProcesses = [multiprocessing.Process(target=write_entries, args=(self.dirCache, idx, oBack))
+                          for idx in range(8)]
+            for process in lProcesses:
+                process.start()
+            for process in lProcesses:
+                process.join()
+            self.assertEqual(dict(oBack), {})
+        self.assertEqual([process.exitcode for process in lProcesses], [0] * 8)
+        # No half-written entries are left behind
+        self.assertEqual([sName for sName in os.listdir(self.dirCache) if not sName.endswith(EXTENSION)], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
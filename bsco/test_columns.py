@@ -0,0 +1,35 @@
+"""The cell values that the items of a BSCO column become"""
+import json
+import unittest
+
+from columns import NormalizedColumn, normalize_column, normalize_items, get_rows
+
+
+class NormalizeTest(unittest.TestCase):
+
+    def test_values(self):
+        lItems = [None, "text", 1700, "=SUM(A1)", [], ["one"], [None], ["=A1"], [1801], [2.5],
+                  ["a", "b"], ["a", 1], 2.5, True, {'key': "value"}]
+        lValues = ["", "text", 1700, '"=SUM(A1)"', "[]", "one", "", '["=A1"]', 1801, 2.5,
+                   '["a", "b"]', '["a", 1]', "2.5", "true", '{"key": "value"}']
+        self.assertEqual(list(normalize_items(lItems)), lValues)
+
+    def test_memo(self):
+        oMemo = {}
+        lItems = ["=x", ["a", "b"], "=x", ["a", "b"], ["a", 1]]
+        lValues = list(normalize_items(lItems, oMemo))
+        self.assertEqual(lValues, [json.dumps(item) for item in lItems])
+        # Strings and lists of strings are remembered, other lists are not
+        self.assertEqual(oMemo, {"=x": '"=x"', ("a", "b"): '["a", "b"]'})
+
+    def test_normalized(self):
+        lColumn = NormalizedColumn(["=x", None])
+        self.assertEqual(list(normalize_column(lColumn)), ["=x", None])
+        self.assertEqual(list(normalize_column(["=x", None])), ['"=x"', ""])
+
+    def test_rows(self):
+        self.assertEqual(list(get_rows([["a", None], [1]])), [("a", 1), ("", None)])
+
+
+if __name__ == "__main__":
+    unittest.main()
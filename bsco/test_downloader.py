@@ -0,0 +1,146 @@
+"""Behaviour of the CRMM downloads against a local stand-in server"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import benchmark
+from downloader import Downloader
+from models import CrmmInfo, downloadfile_to
+
+
+class FlakyHandler(benchmark.StandInHandler):
+    """The stand-in server, replying to the first requests of each path with an error
+
+    /fail/<code>/<times>/<name> replies <times> times with <code> (with a
+    Retry-After of [retry_after], if set), and then like the stand-in server.
+    /short/<name> promises more bytes than it sends and closes the connection.
+    """
+
+    retry_after = None
+    oHits = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.oHits[self.path] = self.oHits.get(self.path, 0) + 1
+            iHit = self.oHits[self.path]
+        lPath = self.path.strip("/").split("/")
+        if lPath[0] == "fail" and iHit <= int(lPath[2]):
+            self.send_response(int(lPath[1]))
+            if self.retry_after != None:
+                self.send_header("Retry-After", self.retry_after)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif lPath[0] == "short":
+            self.send_response(200)
+            self.send_header("Content-Length", "100000")
+            self.end_headers()
+            self.wfile.write(b"( (ID crmm_1))\n" * 10)
+            self.wfile.flush()
+            self.close_connection = True
+        else:
+            self.path = "/psd/" + lPath[-1]
+            super().do_GET()
+
+
+class DownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirOutput = tempfile.mkdtemp(prefix="bsco_test_")
+        self.handler = type("Handler", (FlakyHandler,), {'oHits': {}, 'size': 1000})
+        self.server = benchmark.StandInServer(("127.0.0.1", 0), self.handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+        self.downloader = Downloader(workers=2, retries=2, backoff=0.01)
+
+    def tearDown(self):
+        self.downloader.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dirOutput)
+
+    def get_target(self, sName="crmm_1.psd"):
+        return os.path.join(self.dirOutput, sName)
+
+    def test_download(self):
+        oBack = self.downloader.download(self.url + "/psd/1", self.get_target())
+        self.assertEqual(oBack['status'], "ok")
+        self.assertEqual(os.listdir(self.dirOutput), ["crmm_1.psd"])
+        self.assertEqual(oBack['size'], os.path.getsize(self.get_target()) - 3)
+
+    def test_retry(self):
+        sPath = "/fail/503/2/1"
+        oBack = self.downloader.download(self.url + sPath, self.get_target())
+        self.assertEqual(oBack['status'], "ok")
+        self.assertEqual(self.handler.oHits[sPath], 3)
+
+    def test_retry_gives_up(self):
+        sPath = "/fail/500/9/1"
+        oBack = self.downloader.download(self.url + sPath, self.get_target())
+        self.assertEqual(oBack['status'], "error")
+        self.assertEqual(oBack['code'], 500)
+        # The first try and two retries
+        self.assertEqual(self.handler.oHits[sPath], 3)
+        self.assertEqual(os.listdir(self.dirOutput), [])
+
+    def test_no_retry_not_found(self):
+        sPath = "/fail/404/9/1"
+        oBack = self.downloader.download(self.url + sPath, self.get_target())
+        self.assertEqual(oBack['code'], 404)
+        self.assertEqual(self.handler.oHits[sPath], 1)
+
+    def test_no_retry_bad_url(self):
+        self.downloader.backoff = 10
+        for url in ("", "crmm_1.mrg", "ftp://example.org/crmm_1.mrg", "http://"):
+            limit, bucket = self.downloader.get_host(url)
+            iLimit = limit.limit
+            oBack = self.downloader.download(url, self.get_target())
+            self.assertEqual(oBack['status'], "error", url)
+            self.assertTrue(oBack['bad_url'], url)
+            # Not held against the host
+            self.assertEqual(limit.limit, iLimit, url)
+
+    def test_no_link(self):
+        lCalls = []
+        def download(url, target, headers=None):
+            lCalls.append(url)
+            return {'status': "ok"}
+        for url in ("", None):
+            oInfo = CrmmInfo(line=2, filenum=1, mrg_name="crmm_1.mrg", mrg_url=url, meta_url=url, location="")
+            self.assertEqual(oInfo.create_psd(self.dirOutput, download=download)['status'], "error")
+            self.assertEqual(oInfo.create_meta(self.dirOutput, download=download)['status'], "error")
+        self.assertEqual(lCalls, [])
+
+    def test_retry_after(self):
+        self.handler.retry_after = "1"
+        sPath = "/fail/429/1/1"
+        fStart = time.monotonic()
+        oBack = self.downloader.download(self.url + sPath, self.get_target())
+        self.assertEqual(oBack['status'], "ok")
+        self.assertEqual(self.handler.oHits[sPath], 2)
+        # The backoff alone would retry after 0.01s
+        self.assertGreaterEqual(time.monotonic() - fStart, 0.9)
+
+    def test_retry_after_holds_host(self):
+        self.handler.retry_after = "1"
+        self.downloader.download(self.url + "/fail/503/1/1", self.get_target())
+        # Other requests to the same host wait for the pause too
+        limit, bucket = self.downloader.get_host(self.url)
+        self.assertGreater(bucket.hold, 0)
+
+    def test_no_part_left(self):
+        oBack = downloadfile_to(self.url + "/short/1", self.get_target())
+        self.assertEqual(oBack['status'], "error")
+        self.assertEqual(os.listdir(self.dirOutput), [])
+
+    def test_no_part_left_after_retries(self):
+        oBack = self.downloader.download(self.url + "/short/1", self.get_target())
+        self.assertEqual(oBack['status'], "error")
+        self.assertEqual(os.listdir(self.dirOutput), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
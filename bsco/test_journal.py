@@ -0,0 +1,147 @@
+"""The run journal of the CRMM downloads, and resuming from it"""
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import benchmark
+import crmm
+import storage
+from journal import Journal, PENDING, INFLIGHT, DONE, FAILED
+from models import CrmmInfo
+
+OK = {'status': "ok"}
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirTemp = tempfile.mkdtemp(prefix="bsco_test_")
+        self.flJournal = os.path.join(self.dirTemp, "out_journal.jsonl")
+        self.lInfo = [CrmmInfo(line=idx + 2, filenum=1000 + idx) for idx in range(6)]
+
+    def tearDown(self):
+        shutil.rmtree(self.dirTemp)
+
+    def run_some(self):
+        """Leave the records in all states: done, failed, inflight and not started"""
+
+        journal = Journal(self.flJournal)
+        journal.start(self.lInfo[0])
+        journal.finish(self.lInfo[0], OK, OK)
+        journal.start(self.lInfo[1])
+        journal.finish(self.lInfo[1], OK, {'status': "error", 'code': 404})
+        journal.start(self.lInfo[2])
+        journal.close()
+
+    def get_states(self, journal):
+        return [journal.get_state(oInfo) for oInfo in self.lInfo]
+
+    def get_wanted(self, bResume, bRetryFailed):
+        journal = Journal(self.flJournal, bResume or bRetryFailed)
+        try:
+            return [oInfo.filenum for oInfo in self.lInfo if journal.wants(oInfo, bResume, bRetryFailed)]
+        finally:
+            journal.close()
+
+    def test_states(self):
+        self.run_some()
+        journal = Journal(self.flJournal, True)
+        self.assertEqual(self.get_states(journal), [DONE, FAILED, INFLIGHT, PENDING, PENDING, PENDING])
+        self.assertEqual(journal.oState['1001']['reason'], "meta: 404")
+        journal.close()
+
+    def test_fresh_run(self):
+        self.run_some()
+        self.assertEqual(self.get_wanted(False, False), [1000, 1001, 1002, 1003, 1004, 1005])
+        # A fresh run starts a new journal
+        self.assertEqual(os.path.getsize(self.flJournal), 0)
+
+    def test_resume(self):
+        self.run_some()
+        self.assertEqual(self.get_wanted(True, False), [1002, 1003, 1004, 1005])
+
+    def test_retry_failed(self):
+        self.run_some()
+        self.assertEqual(self.get_wanted(False, True), [1001])
+
+    def test_resume_and_retry_failed(self):
+        self.run_some()
+        self.assertEqual(self.get_wanted(True, True), [1001, 1002, 1003, 1004, 1005])
+
+    def test_cut_off(self):
+        self.run_some()
+        # The interruption cut the last line in half
+        with io.open(self.flJournal, "a", encoding="utf-8") as f:
+            f.write('{"key": "1003", "sta')
+        self.assertEqual(self.get_wanted(True, False), [1002, 1003, 1004, 1005])
+
+    def test_compact(self):
+        self.run_some()
+        Journal(self.flJournal, True).close()
+        with io.open(self.flJournal, "r", encoding="utf-8") as f:
+            lLines = [json.loads(sLine) for sLine in f]
+        # One line per record, with its last state
+        self.assertEqual([(oLine['key'], oLine['state']) for oLine in lLines],
+                         [("1000", DONE), ("1001", FAILED), ("1002", INFLIGHT)])
+
+    def test_resume_finishes(self):
+        self.run_some()
+        journal = Journal(self.flJournal, True)
+        for oInfo in self.lInfo:
+            if journal.wants(oInfo, True, True):
+                journal.start(oInfo)
+                journal.finish(oInfo, OK, OK)
+        journal.close()
+        self.assertEqual(self.get_wanted(True, True), [])
+        journal = Journal(self.flJournal, True)
+        self.assertEqual(journal.get_counts(), {DONE: 6})
+        journal.close()
+
+
+class ResumeTest(unittest.TestCase):
+    """Resuming a crmm run whose packed files were not all saved"""
+
+    def setUp(self):
+        self.dirTemp = tempfile.mkdtemp(prefix="bsco_test_")
+        self.server, sUrl = benchmark.start_server(0.0, 1000)
+        self.flInput = benchmark.make_crmm_index(os.path.join(self.dirTemp, "index.xlsx"), 20, sUrl)
+        self.dirOutput = os.path.join(self.dirTemp, "out")
+        self.oArgs = {'input': self.flInput, 'output': self.dirOutput, 'workers': 2,
+                      'storage': "pack", 'reader': "stream"}
+        self.close = storage.PackStore.close
+
+    def tearDown(self):
+        storage.PackStore.close = self.close
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dirTemp)
+
+    def test_unsaved_pack(self):
+        os.mkdir(self.dirOutput)
+        # Killed before the index of the archive was saved
+        storage.PackStore.close = lambda store: None
+        self.assertTrue(crmm.process_crmm(self.oArgs))
+        storage.PackStore.close = self.close
+        self.assertEqual(storage.PackStore(self.dirOutput).names(), [])
+        journal = Journal(os.path.join(self.dirTemp, "out_journal.jsonl"), True)
+        self.assertEqual(journal.get_counts(), {DONE: 20})
+        journal.close()
+        self.assertTrue(crmm.process_crmm(dict(self.oArgs, resume=True)))
+        self.assertEqual(len(storage.PackStore(self.dirOutput).names()), 40)
+
+    def test_resume_done(self):
+        os.mkdir(self.dirOutput)
+        self.assertTrue(crmm.process_crmm(self.oArgs))
+        # Nothing left to do: no downloads
+        store = storage.PackStore(self.dirOutput)
+        journal = Journal(os.path.join(self.dirTemp, "out_journal.jsonl"), True)
+        self.assertFalse(any(journal.wants(oInfo, True, False, store) for oInfo in crmm.read_index_lean(self.flInput)))
+        journal.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
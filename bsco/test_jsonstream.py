@@ -0,0 +1,103 @@
+"""The incremental reader against json.load() on the same BSCO files"""
+import codecs
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import benchmark
+import jsonstream
+from columns import lStructure
+from jsonstream import JsonColumns
+
+# Values that are hard to skip over: escapes, brackets in strings, nesting
+lTricky = ['plain', '', 'quote " inside', 'back\\slash\\', '\\"', 'brackets ] } [ {', 'comma, colon:',
+           'Ĳsselmonde ‘t Hof', 'emoji \U0001F4DA', '=formula', '\n\t\r', 0, -12, 3.5, 1e-7, 2E+20,
+           True, False, None, [], {}, ['a', ['b', {'c': ']'}]], {'x': [1, 2, {'y': '}'}]}]
+
+
+def make_tricky():
+    """Return a BSCO-shaped object with the tricky values in each column, and sheets that are not read"""
+
+    oOutput = {'Unknown': {'Name': ['skip', {'me': ['[']}]}}
+    for idx, sheetobject in enumerate(lStructure):
+        lValues = lTricky[idx:] + lTricky[:idx]
+        if len(sheetobject['header']) == 0:
+            oOutput[sheetobject['name']] = lValues
+        else:
+            oOutput[sheetobject['name']] = {'Unused': lTricky}
+            for colName in sheetobject['header']:
+                oOutput[sheetobject['name']][colName] = lValues
+                lValues = lValues[1:] + lValues[:1]
+    return oOutput
+
+
+class JsonColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirTemp = tempfile.mkdtemp(prefix="bsco_test_")
+        self.chunk_size = jsonstream.CHUNK_SIZE
+
+    def tearDown(self):
+        jsonstream.CHUNK_SIZE = self.chunk_size
+        shutil.rmtree(self.dirTemp)
+
+    def write(self, oOutput, bBom=False, iIndent=None):
+        flInput = os.path.join(self.dirTemp, "input.json")
+        with io.open(flInput, "wb") as f:
+            if bBom: f.write(codecs.BOM_UTF8)
+            f.write(json.dumps(oOutput, indent=iIndent, ensure_ascii=False).encode("utf-8"))
+        return flInput
+
+    def assert_same(self, flInput):
+        with io.open(flInput, "r", encoding="utf-8-sig") as f:
+            oInput = json.load(f)
+        jcInput = JsonColumns(flInput, lStructure)
+        iRows = 0
+        for sheetobject in lStructure:
+            sheetName = sheetobject['name']
+            if len(sheetobject['header']) == 0:
+                self.assertEqual(list(jcInput[sheetName]), oInput[sheetName])
+                iRows = max(iRows, len(oInput[sheetName]))
+            else:
+                for colName in sheetobject['header']:
+                    self.assertEqual(list(jcInput[sheetName][colName]), oInput[sheetName][colName],
+                                     "{} {}".format(sheetName, colName))
+                    iRows = max(iRows, len(oInput[sheetName][colName]))
+        self.assertEqual(jcInput.count_rows(), iRows)
+
+    def test_synthetic(self):
+        flInput = benchmark.make_bsco(os.path.join(self.dirTemp, "input.json"), 500)
+        self.assert_same(flInput)
+
+    def test_tricky(self):
+        self.assert_same(self.write(make_tricky()))
+
+    def test_tricky_indented_with_bom(self):
+        self.assert_same(self.write(make_tricky(), bBom=True, iIndent=2))
+
+    def test_chunk_boundaries(self):
+        # Chunks this small split strings, escapes and numbers everywhere
+        for iSize in (1, 2, 3, 7):
+            jsonstream.CHUNK_SIZE = iSize
+            self.assert_same(self.write(make_tricky()))
+
+    def test_missing(self):
+        jcInput = JsonColumns(self.write({'Documents': [1, 2]}), lStructure)
+        self.assertEqual(list(jcInput['Documents']), [1, 2])
+        self.assertEqual(jcInput.count_rows(), 2)
+        with self.assertRaises(KeyError):
+            jcInput['Owner']['Name']
+
+    def test_malformed(self):
+        flInput = os.path.join(self.dirTemp, "input.json")
+        with io.open(flInput, "w", encoding="utf-8") as f:
+            f.write('{"Documents": ["open]')
+        with self.assertRaises(ValueError):
+            JsonColumns(flInput, lStructure)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Sync mode: the manifest and the conditional requests it leads to"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import benchmark
+import manifest
+import util
+from manifest import Manifest
+from models import CrmmInfo
+
+
+class SyncTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.url = benchmark.start_server(0.0, 1000)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.dirOutput = tempfile.mkdtemp(prefix="bsco_test_")
+        self.flManifest = os.path.join(self.dirOutput, "out_manifest.json")
+        util.profiler.reset()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirOutput)
+
+    def get_info(self, line=2, filenum=1001):
+        return CrmmInfo(line=line, filenum=filenum, mrg_name="crmm_{}.mrg".format(filenum),
+                        mrg_url="{}/psd/{}".format(self.url, filenum), location="xDC108Groningen1")
+
+    def sync(self, oInfo):
+        oManifest = Manifest(self.flManifest)
+        oBack = oInfo.create_psd(self.dirOutput, manifest=oManifest)
+        oManifest.save()
+        return oBack
+
+    def get_counters(self):
+        return util.profiler.get_report()['counters']
+
+    def test_hash(self):
+        oInfo = self.get_info()
+        # Moving the row keeps the hash, changing its content does not
+        self.assertEqual(self.get_info(line=40).get_hash(), oInfo.get_hash())
+        oInfo.location = "xDF573regioHavelte"
+        self.assertNotEqual(self.get_info().get_hash(), oInfo.get_hash())
+
+    def test_unchanged(self):
+        self.assertEqual(self.sync(self.get_info())['status'], "ok")
+        self.assertEqual(self.sync(self.get_info())['status'], "ok")
+        oCounters = self.get_counters()
+        self.assertEqual(oCounters['files_downloaded'], 1)
+        self.assertEqual(oCounters['files_unchanged'], 1)
+
+    def test_row_moved(self):
+        self.sync(self.get_info())
+        # A row inserted above: only the line number changes
+        self.sync(self.get_info(line=3))
+        self.assertEqual(self.get_counters()['files_unchanged'], 1)
+
+    def test_row_changed(self):
+        self.sync(self.get_info())
+        oInfo = self.get_info()
+        oInfo.mrg_name = "crmm_1001b.mrg"
+        self.sync(oInfo)
+        self.assertEqual(self.get_counters()['files_downloaded'], 2)
+        self.assertNotIn('files_unchanged', self.get_counters())
+
+    def test_saved_on_the_way(self):
+        oManifest = Manifest(self.flManifest)
+        for idx in range(manifest.MANIFEST_SAVE_EVERY):
+            oManifest.set("crmm_{}.psd".format(idx), {'url': str(idx)})
+        # Without save(), as when the run is killed
+        self.assertEqual(len(Manifest(self.flManifest).oEntries), manifest.MANIFEST_SAVE_EVERY)
+        oManifest.set("crmm_last.psd", {'url': "last"})
+        self.assertNotIn("crmm_last.psd", Manifest(self.flManifest).oEntries)
+        oManifest.save()
+        self.assertIn("crmm_last.psd", Manifest(self.flManifest).oEntries)
+
+
+if __name__ == "__main__":
+    unittest.main()
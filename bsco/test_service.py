@@ -0,0 +1,110 @@
+"""The job service, also when its workers die"""
+import json
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+import benchmark
+import service
+
+
+def fail_warm_up():
+    raise RuntimeError("No workers today")
+
+
+class ServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirTemp = tempfile.mkdtemp(prefix="bsco_test_")
+        self.flInput = benchmark.make_bsco(os.path.join(self.dirTemp, "input.json"), 20)
+        self.service = service.JobService(1)
+        self.server = service.ServiceServer((service.HOST, 0), service.ServiceHandler)
+        self.server.service = self.service
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+        self.warm_up = service.warm_up
+
+    def tearDown(self):
+        service.warm_up = self.warm_up
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.close()
+        shutil.rmtree(self.dirTemp)
+
+    def call(self, sPath, oData=None):
+        bData = None if oData == None else json.dumps(oData).encode("utf-8")
+        try:
+            with urllib.request.urlopen(urllib.request.Request(self.url + sPath, data=bData)) as r:
+                return r.status, json.load(r)
+        except urllib.error.HTTPError as e:
+            return e.code, json.load(e)
+
+    def convert(self, sName="output"):
+        return self.call("/jobs", {'command': "bsco convert",
+                                   'args': {'input': self.flInput, 'output': os.path.join(self.dirTemp, sName + ".xlsx")}})
+
+    def wait(self, id):
+        for idx in range(600):
+            code, oJob = self.call("/jobs/{}".format(id))
+            if oJob['status'] not in ("queued", "running"):
+                return oJob
+            time.sleep(0.05)
+        self.fail("Job {} did not finish".format(id))
+
+    def kill_workers(self):
+        executor = self.service.executor
+        for process in list(executor._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+        # Wait until the pool knows
+        for idx in range(200):
+            if executor._broken:
+                return
+            time.sleep(0.05)
+
+    def test_job(self):
+        code, oBack = self.convert()
+        self.assertEqual(code, 202)
+        oJob = self.wait(oBack['id'])
+        self.assertEqual(oJob['status'], "done")
+        self.assertEqual(oJob['rows'], 20)
+        self.assertEqual(oJob['metrics']['counters']['rows_written'], 20)
+        self.assertTrue(os.path.exists(os.path.join(self.dirTemp, "output_compact.xlsx")))
+
+    def test_bad_requests(self):
+        self.assertEqual(self.call("/jobs", {'command': "bsco delete", 'args': {'input': "x"}})[0], 400)
+        self.assertEqual(self.call("/jobs", {'command': "bsco convert", 'args': {}})[0], 400)
+        self.assertEqual(self.call("/jobs/99")[0], 404)
+
+    def test_worker_died(self):
+        self.kill_workers()
+        code, oBack = self.convert()
+        self.assertEqual(code, 202)
+        self.assertEqual(self.wait(oBack['id'])['status'], "done")
+        code, oMetrics = self.call("/metrics")
+        self.assertEqual(oMetrics['restarts'], 1)
+        self.assertEqual(oMetrics['jobs'], {'done': 1})
+
+    def test_no_workers(self):
+        service.warm_up = fail_warm_up
+        self.kill_workers()
+        code, oBack = self.convert()
+        self.assertEqual(code, 503)
+        # The service itself keeps going
+        code, oMetrics = self.call("/metrics")
+        self.assertEqual(code, 200)
+        self.assertEqual(oMetrics['jobs'], {})
+        # Until the workers can start again
+        service.warm_up = self.warm_up
+        code, oBack = self.convert()
+        self.assertEqual(code, 202)
+        self.assertEqual(self.wait(oBack['id'])['status'], "done")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""The checks of the downloaded PSD and metadata files"""
+import codecs
+import io
+import unittest
+
+from validate import check_meta, check_psd
+
+PSD = b"""( (IP-MAT (NP-SBJ (N Jan)) (VBD sprak) (NP-OB1 (NPR *exp*)) (. .))
+  (ID crmm_1.1))
+( (IP-MAT (N Piet))
+  (ID crmm_1.2))
+"""
+
+
+class CheckTest(unittest.TestCase):
+
+    def meta(self, sText):
+        return check_meta(io.BytesIO(sText.encode("utf-8")))
+
+    def psd(self, bText):
+        return check_psd(io.BytesIO(bText))
+
+    def test_meta(self):
+        self.assertEqual(self.meta('<?xml version="1.0"?><meta><id>1</id></meta>'), {'status': "ok"})
+        self.assertEqual(self.meta('<meta xmlns="http://example.org/crmm"><id>1</id></meta>'), {'status': "ok"})
+
+    def test_meta_html(self):
+        for sText in ('<html><body>Not found</body></html>',
+                      '<HTML><BODY>Not found</BODY></HTML>',
+                      '<html xmlns="http://www.w3.org/1999/xhtml"><body>Not found</body></html>',
+                      '<h:html xmlns:h="http://www.w3.org/1999/xhtml"><h:body/></h:html>'):
+            self.assertEqual(self.meta(sText)['status'], "error", sText)
+
+    def test_meta_malformed(self):
+        for sText in ('', '<meta><id>1</meta>', '<!DOCTYPE html><html><br></html>'):
+            self.assertEqual(self.meta(sText)['status'], "error", sText)
+
+    def test_psd(self):
+        oBack = self.psd(PSD)
+        self.assertEqual(oBack['status'], "ok")
+        self.assertEqual(oBack['sentences'], 2)
+        # Jan sprak . Piet: not the ID leaves and not the empty *exp*
+        self.assertEqual(oBack['tokens'], 4)
+        self.assertEqual(oBack['offsets'], [0, PSD.index(b"( (IP-MAT (N Piet")])
+        self.assertEqual(oBack['size'], len(PSD))
+
+    def test_psd_bom(self):
+        oBack = self.psd(codecs.BOM_UTF8 + PSD)
+        self.assertEqual(oBack['status'], "ok")
+        self.assertEqual(oBack['offsets'][0], 3)
+
+    def test_psd_errors(self):
+        for bText in (PSD + b")", PSD + b"(", b"oops " + PSD, b"", b"\n  \n"):
+            self.assertEqual(self.psd(bText)['status'], "error", bText)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""The lean index reader against openpyxl on the same workbooks"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import openpyxl
+from openpyxl.cell.rich_text import CellRichText, TextBlock
+from openpyxl.cell.text import InlineFont
+
+import benchmark
+import xlsxindex
+from crmm import read_index, read_index_lean
+
+
+class ReadIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirTemp = tempfile.mkdtemp(prefix="bsco_test_")
+        self.flInput = os.path.join(self.dirTemp, "index.xlsx")
+
+    def tearDown(self):
+        shutil.rmtree(self.dirTemp)
+
+    def assert_same(self, iRecords=None):
+        wbInput = openpyxl.load_workbook(filename=self.flInput)
+        lLoad = [oInfo.get_json() for oInfo in read_index(wbInput.active)]
+        lStream = [oInfo.get_json() for oInfo in read_index_lean(self.flInput)]
+        self.assertEqual(lStream, lLoad)
+        if iRecords != None:
+            self.assertEqual(len(lStream), iRecords)
+        return lStream
+
+    def test_synthetic(self):
+        benchmark.make_crmm_index(self.flInput, 300)
+        lInfo = self.assert_same(300)
+        self.assertEqual(lInfo[0]['mrg_url'], "http://127.0.0.1:8000/psd/1001")
+
+    def test_odd_sheet(self):
+        wb = openpyxl.Workbook()
+        # The index is not the first sheet, but it is the active one
+        wb.active.title = "Notes"
+        wb.active.append(["not", "the", "index"])
+        ws = wb.create_sheet("Index")
+        wb.active = 1
+        ws.append(["Nr", "File", "MRG", "Meta", "Wijk", "Groningen", "Havelte"])
+        ws.append([1, 1001, "crmm_1001.mrg", "meta", 1, None, None])
+        ws.append([2.0, "1002", CellRichText(["crmm_", TextBlock(InlineFont(b=True), "1002"), ".mrg"]), "meta", "", "1", ""])
+        ws.append([3, 1003.5, True, None, None, None, "1", "extra column"])
+        # Row 5 is left out: the record numbers stop there
+        ws.cell(row=6, column=1, value=6)
+        ws.cell(row=6, column=2, value=1006)
+        for row in (2, 3, 6):
+            ws.cell(row=row, column=3).hyperlink = "https://example.org/psd?id={}&x=1".format(row)
+        ws.cell(row=2, column=4).hyperlink = "https://example.org/meta/2"
+        ws.cell(row=4, column=5).hyperlink = "https://example.org/unused"
+        wb.save(self.flInput)
+        lInfo = self.assert_same(3)
+        self.assertEqual(lInfo[1]['mrg_name'], "crmm_1002.mrg")
+        self.assertEqual(lInfo[0]['meta_url'], "https://example.org/meta/2")
+
+    def test_empty(self):
+        wb = openpyxl.Workbook()
+        wb.active.append(["Nr", "File", "MRG", "Meta", "Wijk", "Groningen", "Havelte"])
+        wb.save(self.flInput)
+        self.assert_same(0)
+
+    def test_rows_on_demand(self):
+        benchmark.make_crmm_index(self.flInput, 50)
+        rows, oLinks = xlsxindex.read_sheet(self.flInput, min_row=2)
+        # The links are there before any row is read
+        self.assertEqual(len(oLinks), 100)
+        self.assertFalse(isinstance(rows, list))
+        self.assertEqual(next(rows)[:2], (1, 1001))
+        self.assertEqual(len(list(rows)), 49)
+
+    def test_links_in_chunks(self):
+        benchmark.make_crmm_index(self.flInput, 50)
+        rows, oLinks = xlsxindex.read_sheet(self.flInput)
+        chunk_size = xlsxindex.CHUNK_SIZE
+        try:
+            # The end of the cells is split over two chunks somewhere
+            for iSize in (1, 5, 13, 100):
+                xlsxindex.CHUNK_SIZE = iSize
+                self.assertEqual(xlsxindex.read_sheet(self.flInput)[1], oLinks)
+        finally:
+            xlsxindex.CHUNK_SIZE = chunk_size
+
+    def test_get_range(self):
+        self.assertEqual(xlsxindex.get_range("C2"), ["C2"])
+        self.assertEqual(xlsxindex.get_range("Y9:AA10"), ["Y9", "Z9", "AA9", "Y10", "Z10", "AA10"])
+        self.assertEqual(xlsxindex.get_column("AB"), 28)
+        self.assertEqual(xlsxindex.get_letters(28), "AB")
+
+
+if __name__ == "__main__":
+    unittest.main()
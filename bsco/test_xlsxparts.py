@@ -0,0 +1,109 @@
+"""The workbooks assembled from worksheet parts against the cell engine"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import openpyxl
+
+import bsco
+import xlsxparts
+from columns import lStructure
+from test_jsonstream import lTricky
+
+# Values on which a worksheet part could differ from openpyxl: spaces to keep,
+# and one-item lists that stay a bool, a number or an empty cell
+lValues = lTricky + [' leading', 'trailing ', '  ', ' both\t', 'a & b < c > d', [True], [False],
+                     [3.5], [-0.0], [1e-7], [2E+20], [123456789.123456789], [0.1 + 0.2], [1e16], [12345678901234567890],
+                     [float('nan')], [float('inf')], [None], [''], ['=x']]
+
+
+def make_input(lThis):
+    """Return a BSCO-shaped object with the values [lThis] in each column, which differ in length"""
+
+    oOutput = {}
+    for idx, sheetobject in enumerate(lStructure):
+        if len(sheetobject['header']) == 0:
+            oOutput[sheetobject['name']] = lThis
+        else:
+            oOutput[sheetobject['name']] = {}
+            for iCol, colName in enumerate(sheetobject['header']):
+                lColumn = lThis[iCol:] + lThis[:iCol]
+                oOutput[sheetobject['name']][colName] = lColumn[:len(lColumn) - (idx + iCol) % 5]
+    return oOutput
+
+
+class PartsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirTemp = tempfile.mkdtemp(prefix="bsco_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.dirTemp)
+
+    def write(self, oInput):
+        flInput = os.path.join(self.dirTemp, "input.json")
+        with io.open(flInput, "w", encoding="utf-8") as f:
+            json.dump(oInput, f, ensure_ascii=False)
+        return flInput
+
+    def convert(self, flInput, sName, iJobs, bPlain=False):
+        oArgs = {'input': flInput, 'output': os.path.join(self.dirTemp, sName + ".xlsx"),
+                 'method': "full", 'jobs': iJobs, 'plain': bPlain}
+        with contextlib.redirect_stderr(io.StringIO()):
+            bOkay = bsco.process_bsco(oArgs)
+        return bOkay, os.path.join(self.dirTemp, sName + "_full.xlsx")
+
+    def assert_same(self, flCell, flParts):
+        wbCell = openpyxl.load_workbook(flCell)
+        wbParts = openpyxl.load_workbook(flParts)
+        self.assertEqual(wbParts.sheetnames, wbCell.sheetnames)
+        for wsCell, wsParts in zip(wbCell.worksheets, wbParts.worksheets):
+            self.assertEqual((wsParts.max_row, wsParts.max_column), (wsCell.max_row, wsCell.max_column), wsCell.title)
+            for rowCell, rowParts in zip(wsCell.iter_rows(), wsParts.iter_rows()):
+                for cCell, cParts in zip(rowCell, rowParts):
+                    sWhere = "{}!{}".format(wsCell.title, cCell.coordinate)
+                    self.assertEqual(cParts.value, cCell.value, sWhere)
+                    self.assertIs(type(cParts.value), type(cCell.value), sWhere)
+                    if cCell.value is None:
+                        continue
+                    self.assertEqual(bool(cParts.font.b), bool(cCell.font.b), sWhere)
+                    self.assertEqual(bool(cParts.alignment.wrap_text), bool(cCell.alignment.wrap_text), sWhere)
+                    self.assertEqual(cParts.style, cCell.style, sWhere)
+            self.assertEqual(wsParts.column_dimensions["A"].width, wsCell.column_dimensions["A"].width)
+
+    def test_tricky(self):
+        flInput = self.write(make_input(lValues))
+        for bPlain in (False, True):
+            sPlain = "plain" if bPlain else "styled"
+            bOkay, flCell = self.convert(flInput, "cell_" + sPlain, 1, bPlain)
+            self.assertTrue(bOkay)
+            bOkay, flParts = self.convert(flInput, "parts_" + sPlain, 2, bPlain)
+            self.assertTrue(bOkay)
+            self.assert_same(flCell, flParts)
+        wb = openpyxl.load_workbook(flParts)
+        ws = wb["Documents"]
+        # The header is bold, the values keep their type and their spaces
+        self.assertTrue(ws["A1"].font.b)
+        lBack = [c.value for c in ws["A"][1:]]
+        for value in (' leading', 'trailing ', ' both\t', True, 3.5, 2E+20, '"=formula"'):
+            self.assertIn(value, lBack)
+
+    def test_illegal_character(self):
+        flInput = self.write(make_input(['fine', 'bell \x07 rings', 'fine']))
+        bOkay, flParts = self.convert(flInput, "parts", 2)
+        # No workbook with a silently missing value, and no parts left behind
+        self.assertFalse(bOkay)
+        self.assertFalse(os.path.exists(flParts))
+        self.assertEqual(sorted(os.listdir(self.dirTemp)), ["input.json"])
+        with self.assertRaises(ValueError):
+            xlsxparts.get_cell("A2", "form\x0cfeed", xlsxparts.STYLE_CELL)
+        # Tab, newline and carriage return are allowed
+        self.assertIn("\t\n\r", xlsxparts.get_cell("A2", "\t\n\r", xlsxparts.STYLE_CELL))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,17 @@
 import sys, traceback
+import threading
+import io, json, time
+import functools
+import tracemalloc
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+# Keep status lines of parallel downloads from being interleaved
+status_lock = threading.Lock()
 
 class ErrHandle:
     """Error handling"""
@@ -16,7 +29,8 @@ class ErrHandle:
     # ----------------------------------------------------------------------------------
     def Status(self, msg):
         # Just print the message
-        print(msg, file=sys.stderr)
+        with status_lock:
+            print(msg, file=sys.stderr)
 
     # ----------------------------------------------------------------------------------
     # Name :    DoError
@@ -49,3 +63,113 @@ class ErrHandle:
 
     def get_error_stack(self):
         return " ".join(self.loc_errStack)
+
+
+class Profiler:
+    """Stage timings, counters and memory use of one run"""
+
+    # ======================= CLASS INITIALIZER ========================================
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.oStages = {}       # Per stage: number of calls and total seconds
+        self.oCounters = {}     # Per counter: its total
+        self.lSnapshots = []    # Memory use at labelled moments
+        self.bTrace = False     # Whether tracemalloc has been started
+        self.fStart = time.time()
+
+    def reset(self):
+        """Forget everything measured so far: for a process that runs one job after another"""
+
+        with self.lock:
+            self.oStages = {}
+            self.oCounters = {}
+            self.lSnapshots = []
+            self.fStart = time.time()
+
+    # ----------------------------------------------------------------------------------
+    # Name :    stage
+    # Goal :    Context manager that adds the time spent in its block to stage [sName]
+    # History:
+    # 18/oct/2026    ERK Created
+    # ----------------------------------------------------------------------------------
+    @contextmanager
+    def stage(self, sName):
+        fStart = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(sName, time.perf_counter() - fStart)
+
+    def add_time(self, sName, fSeconds):
+        """Add one call of [fSeconds] to stage [sName]"""
+
+        with self.lock:
+            oStage = self.oStages.setdefault(sName, {'calls': 0, 'seconds': 0.0})
+            oStage['calls'] += 1
+            oStage['seconds'] += fSeconds
+
+    def timed(self, sName=None):
+        """Decorator that times every call of a function as stage [sName]"""
+
+        def decorator(fn):
+            sStage = sName or fn.__name__
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(sStage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, sName, iAmount=1):
+        """Add [iAmount] to counter [sName]"""
+
+        with self.lock:
+            self.oCounters[sName] = self.oCounters.get(sName, 0) + iAmount
+
+    def start_trace(self):
+        """Start following Python memory allocations (slows the program down)"""
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.bTrace = True
+
+    def get_peak_rss(self):
+        """Return the peak resident set size of this process in bytes, if known"""
+
+        if resource == None:
+            return None
+        iPeak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux gives kilobytes, macOS bytes
+        return iPeak if sys.platform == "darwin" else iPeak * 1024
+
+    def snapshot(self, sLabel):
+        """Note the memory use at this moment under [sLabel]"""
+
+        oSnapshot = {'label': sLabel, 'time': round(time.time() - self.fStart, 3), 'peak_rss': self.get_peak_rss()}
+        if self.bTrace:
+            iCurrent, iPeak = tracemalloc.get_traced_memory()
+            oSnapshot['traced_current'] = iCurrent
+            oSnapshot['traced_peak'] = iPeak
+            # The lines that hold most memory
+            oSnapshot['top'] = [str(stat) for stat in tracemalloc.take_snapshot().statistics('lineno')[:10]]
+        with self.lock:
+            self.lSnapshots.append(oSnapshot)
+
+    def get_report(self):
+        """Return everything measured so far as a dictionary"""
+
+        with self.lock:
+            return {'seconds': round(time.time() - self.fStart, 3),
+                    'stages': {k: {'calls': v['calls'], 'seconds': round(v['seconds'], 6)} for k, v in self.oStages.items()},
+                    'counters': dict(self.oCounters),
+                    'peak_rss': self.get_peak_rss(),
+                    'snapshots': list(self.lSnapshots)}
+
+    def save(self, flReport):
+        """Write the report as JSON to [flReport]"""
+
+        with io.open(flReport, "w", encoding="utf-8") as f:
+            json.dump(self.get_report(), f, indent=2)
+
+# The profiler that all modules report to
+profiler = Profiler()
@@ -0,0 +1,216 @@
+# ==========================================================================================================
+# Name :    validate
+# Goal :    Check the downloaded CRMM files and index what they contain
+#           1 - check the bracketed structure of each .psd file
+#           2 - check that each .meta.xml file is well-formed XML
+#           3 - write an index: per filenum the location, the number of sentences
+#               and tokens, and the byte offset of each sentence in the .psd file
+# History:
+# 18/oct/2026    ERK Created
+# ==========================================================================================================
+import sys, getopt, os.path
+import util, json, io
+import codecs
+import re
+import xml.etree.ElementTree as ET
+import storage
+
+# ============================= LOCAL VARIABLES ====================================
+errHandle = util.ErrHandle()
+# Leaves with these labels are not words of the text
+NON_TOKENS = (b"ID", b"CODE", b"METADATA")
+# Brackets and the labels and words between them
+re_atom = re.compile(rb'[()]|[^()\s]+')
+
+
+def check_psd(f):
+    """Check the bracketed structure of the PSD text in the binary file [f]
+
+    Each sentence is one tree at the top level, and nothing but white space
+    may be outside the trees. Tokens are the leaves (LABEL word), except for
+    labels in NON_TOKENS and empty elements (words starting with "*").
+    Returns {'status', 'sentences', 'tokens', 'offsets', 'size'}, with 'msg'
+    when the status is "error".
+    """
+
+    oBack = {'status': 'ok', 'sentences': 0, 'tokens': 0, 'offsets': [], 'size': 0}
+    lStack = []     # Per open bracket: [label, number of atoms, has subtrees, last atom]
+    offset = 0
+    for sLine in f:
+        pos = 0
+        if offset == 0 and sLine.startswith(codecs.BOM_UTF8):
+            pos = len(codecs.BOM_UTF8)
+        for m in re_atom.finditer(sLine, pos):
+            sAtom = m.group()
+            if sAtom == b"(":
+                if len(lStack) == 0:
+                    # A new sentence
+                    oBack['offsets'].append(offset + m.start())
+                else:
+                    lStack[-1][2] = True
+                lStack.append([None, 0, False, None])
+            elif sAtom == b")":
+                if len(lStack) == 0:
+                    return psd_error(oBack, "Unbalanced ) at offset {}".format(offset + m.start()))
+                label, iAtoms, bSubtrees, sWord = lStack.pop()
+                if not bSubtrees and iAtoms == 2 and label not in NON_TOKENS and not sWord.startswith(b"*"):
+                    oBack['tokens'] += 1
+            elif len(lStack) == 0:
+                return psd_error(oBack, "Text outside brackets at offset {}".format(offset + m.start()))
+            else:
+                node = lStack[-1]
+                if node[1] == 0:
+                    node[0] = sAtom
+                node[1] += 1
+                node[3] = sAtom
+        offset += len(sLine)
+    oBack['size'] = offset
+    oBack['sentences'] = len(oBack['offsets'])
+    if len(lStack) > 0:
+        return psd_error(oBack, "Unclosed ( at the end of the file")
+    elif oBack['sentences'] == 0:
+        return psd_error(oBack, "No sentences")
+    return oBack
+
+def psd_error(oBack, sMsg):
+    oBack['status'] = "error"
+    oBack['msg'] = sMsg
+    return oBack
+
+def check_meta(f):
+    """Check that the binary file [f] is well-formed XML, and not an HTML page"""
+
+    oBack = {'status': 'ok'}
+    try:
+        sRoot = None
+        for event, el in ET.iterparse(f, events=("start", "end")):
+            if sRoot == None:
+                sRoot = el.tag
+            elif event == "end":
+                el.clear()
+        # Without the namespace: XHTML pages have {http://www.w3.org/1999/xhtml}html
+        if sRoot.rsplit("}", 1)[-1].lower() == "html":
+            oBack['status'] = "error"
+            oBack['msg'] = "An HTML page instead of metadata"
+    except ET.ParseError as e:
+        oBack['status'] = "error"
+        oBack['msg'] = "Not well-formed: {}".format(e)
+    return oBack
+
+def check_file(store, sName, check):
+    """Run [check] on the file [sName] of [store]"""
+
+    if not store.exists(sName):
+        return {'status': "missing", 'msg': "Not downloaded"}
+    with store.open(sName) as f:
+        return check(f)
+
+def validate_info(info_list, store):
+    """Check the files of the records in [info_list]: yield (record, PSD result, meta result)"""
+
+    for oInfo in info_list:
+        oPsd = check_file(store, "crmm_{}.psd".format(oInfo['filenum']), check_psd)
+        oMeta = check_file(store, "crmm_{}.meta.xml".format(oInfo['filenum']), check_meta)
+        yield oInfo, oPsd, oMeta
+
+# ----------------------------------------------------------------------------------
+# Name :    validate_dir
+# Goal :    Check all files of a CRMM download and write the index
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def validate_dir(dirOutput, store=None, flIndex=None):
+    """Check the files in [dirOutput] of all records of its _info.json
+
+    The index goes to [flIndex] (default: <output>_index.json). Returns
+    the list of (record, PSD result, meta result) of the files that are
+    there, but are not valid.
+    """
+
+    flBase = dirOutput.split(sep=".")[0]
+    if flIndex == None: flIndex = "{}_index.json".format(flBase)
+    if store == None: store = storage.get_store(dirOutput)
+    with io.open("{}_info.json".format(flBase), "r", encoding="utf-8-sig") as f:
+        info_list = json.load(f)
+    oIndex = {}
+    lInvalid = []
+    oCount = {}
+    for oInfo, oPsd, oMeta in validate_info(info_list, store):
+        oEntry = {'location': oInfo['location'],
+                  'psd': oPsd['status'], 'meta': oMeta['status']}
+        if oPsd['status'] == "ok":
+            oEntry['sentences'] = oPsd['sentences']
+            oEntry['tokens'] = oPsd['tokens']
+            oEntry['size'] = oPsd['size']
+            oEntry['offsets'] = oPsd['offsets']
+        lErrors = [oBack['msg'] for oBack in (oPsd, oMeta) if oBack['status'] == "error"]
+        if len(lErrors) > 0:
+            oEntry['errors'] = lErrors
+            lInvalid.append((oInfo, oPsd, oMeta))
+            for sFile, oBack in (("PSD", oPsd), ("metadata", oMeta)):
+                if oBack['status'] == "error":
+                    errHandle.Status("Invalid {} for {}: {}".format(sFile, oInfo['filenum'], oBack['msg']))
+        for sStatus in (oPsd['status'], oMeta['status']):
+            oCount[sStatus] = oCount.get(sStatus, 0) + 1
+        oIndex[str(oInfo['filenum'])] = oEntry
+    sTemp = flIndex + ".part"
+    with io.open(sTemp, "w", encoding="utf-8") as f:
+        json.dump(oIndex, f, separators=(",", ":"))
+    os.replace(sTemp, flIndex)
+    util.profiler.count("files_invalid", oCount.get("error", 0))
+    errHandle.Status("Validated files: {}".format(json.dumps(oCount, sort_keys=True)))
+    return lInvalid
+
+# ----------------------------------------------------------------------------------
+# Name :    main
+# Goal :    Main body of the function
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def main(prgName, argv) :
+  dirInput = ''       # CRMM output directory
+  flIndex = ''        # Index file (default: <directory>_index.json)
+
+  try:
+    # Adapt the program name to exclude the directory
+    index = prgName.rfind("\\")
+    if (index > 0) :
+      prgName = prgName[index+1:]
+    sSyntax = prgName + ' -i <CRMM output directory> [-o <index file>]'
+    # get all the arguments
+    try:
+      # Get arguments and options
+      opts, args = getopt.getopt(argv, "hi:o:", ["input=","output="])
+    except getopt.GetoptError:
+      print(sSyntax)
+      sys.exit(2)
+    # Walk all the arguments
+    for opt, arg in opts:
+      if opt in ("-h", "--help"):
+        print(sSyntax)
+        sys.exit(0)
+      elif opt in ("-i", "--input"):
+        dirInput = arg
+      elif opt in ("-o", "--output"):
+        flIndex = arg
+    # Check if all arguments are there
+    if dirInput == '' or not os.path.isdir(dirInput):
+      errHandle.DoError(sSyntax)
+      return False
+    store = storage.get_store(dirInput)
+    try:
+      lInvalid = validate_dir(dirInput, store, flIndex or None)
+    finally:
+      store.close()
+    return len(lInvalid) == 0
+  except:
+    # act
+    errHandle.DoError("main")
+    return False
+
+# ----------------------------------------------------------------------------------
+# Goal :  If user calls this as main, then follow up on it
+# ----------------------------------------------------------------------------------
+if __name__ == "__main__":
+  # Call the main function with two arguments: program name + remainder
+  main(sys.argv[0], sys.argv[1:])
@@ -0,0 +1,249 @@
+"""Lean reader for the worksheet of an Excel index
+
+Only the active worksheet is read, straight from the XML in the .xlsx
+package, and only the values of its first columns. Styles, other sheets
+and all other cells are never built. The hyperlinks of the sheet are
+resolved through its relationships part. Values come out as openpyxl
+would give them with values_only=True: shared and inline strings as
+text, numbers as int or float, booleans as bool and no cell as None.
+
+The hyperlinks come after the cells. They are read first, from the end
+of the sheet XML. The rows are then parsed one by one, as they are used,
+so they are never all in memory at once.
+
+"""
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+re_ref = re.compile(r'([A-Z]+)(\d+)')
+# The start tag of the root element, and the end of the cells: also an empty <sheetData/>
+re_root = re.compile(rb'<(?![?!])[^>]*>')
+re_cells_end = re.compile(rb'</(?:[\w.-]+:)?sheetData\s*>|<(?:[\w.-]+:)?sheetData\s*/>')
+# Number of bytes of the sheet XML that are searched at a time
+CHUNK_SIZE = 1 << 16
+# Longest end tag of the cells
+TAG_SIZE = 64
+
+
+def get_column(sLetters):
+    """Return the column number of column letters like "C" or "AB\""""
+
+    col = 0
+    for ch in sLetters:
+        col = col * 26 + ord(ch) - 64
+    return col
+
+def get_rels(zf, sPart):
+    """Return the relationships of [sPart] as {id: (type, target)}, with targets as part names"""
+
+    sDir, sName = posixpath.split(sPart)
+    sRels = posixpath.join(sDir, "_rels", sName + ".rels")
+    oRels = {}
+    if sRels not in zf.namelist():
+        return oRels
+    with zf.open(sRels) as f:
+        # A sheet with many hyperlinks has as many relationships: drop each once read
+        root = None
+        for event, el in ET.iterparse(f, events=("start", "end")):
+            if root == None:
+                root = el
+            if event == "start" or el.tag != NS_PKG + "Relationship":
+                continue
+            sTarget = el.get("Target")
+            if el.get("TargetMode") != "External":
+                # Internal targets are relative to the directory of the part
+                if sTarget.startswith("/"):
+                    sTarget = sTarget[1:]
+                else:
+                    sTarget = posixpath.normpath(posixpath.join(sDir, sTarget))
+            oRels[el.get("Id")] = (el.get("Type").rsplit("/", 1)[-1], sTarget)
+            root.remove(el)
+    return oRels
+
+def get_text(el):
+    """Return the text of a shared or inline string: plain, or the runs of rich text"""
+
+    t = el.find(NS_MAIN + "t")
+    if t != None:
+        return t.text or ""
+    return "".join(r.text or "" for r in el.iterfind(NS_MAIN + "r/" + NS_MAIN + "t"))
+
+def read_shared_strings(zf, sPart):
+    lStrings = []
+    if sPart == None:
+        return lStrings
+    with zf.open(sPart) as f:
+        for event, el in ET.iterparse(f):
+            if el.tag == NS_MAIN + "si":
+                lStrings.append(get_text(el))
+                el.clear()
+    return lStrings
+
+def get_value(el, lStrings):
+    """Return the value of cell element [el]"""
+
+    sType = el.get("t", "n")
+    if sType == "inlineStr":
+        is_ = el.find(NS_MAIN + "is")
+        return None if is_ == None else get_text(is_)
+    v = el.find(NS_MAIN + "v")
+    if v == None or v.text == None:
+        return None
+    sValue = v.text
+    if sType == "s":
+        return lStrings[int(sValue)]
+    elif sType == "b":
+        return bool(int(sValue))
+    elif sType == "n":
+        # The same rule as openpyxl
+        if "." in sValue or "E" in sValue or "e" in sValue:
+            return float(sValue)
+        return int(sValue)
+    # Formula strings, errors and dates as their text
+    return sValue
+
+def get_active_sheet(zf):
+    """Return the part name of the active worksheet and the shared strings part"""
+
+    oRels = get_rels(zf, "")
+    sWorkbook = [sTarget for sType, sTarget in oRels.values() if sType == "officeDocument"][0]
+    oBookRels = get_rels(zf, sWorkbook)
+    with zf.open(sWorkbook) as f:
+        root = ET.parse(f).getroot()
+    view = root.find(NS_MAIN + "bookViews/" + NS_MAIN + "workbookView")
+    iActive = 0 if view == None else int(view.get("activeTab", 0))
+    lSheets = [el.get(NS_REL + "id") for el in root.iterfind(NS_MAIN + "sheets/" + NS_MAIN + "sheet")]
+    if iActive >= len(lSheets):
+        iActive = 0
+    sSheet = oBookRels[lSheets[iActive]][1]
+    lShared = [sTarget for sType, sTarget in oBookRels.values() if sType == "sharedStrings"]
+    return sSheet, (lShared[0] if len(lShared) > 0 else None)
+
+def read_links(zf, sSheet):
+    """Return the targets of the hyperlinks of worksheet [sSheet], keyed by cell coordinate
+
+    The hyperlinks come after the cells, so the bytes of the sheet are only
+    searched for the end of the cells. What comes after it is parsed, under
+    the start tag of the root element for the namespaces.
+    """
+
+    oSheetRels = get_rels(zf, sSheet)
+    oLinks = {}
+    bRoot = None        # Start tag of the root element
+    bBuf = b""
+    parser = None       # Parser of what comes after the cells
+    parent = None       # Element that holds the hyperlinks
+    with zf.open(sSheet) as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if parser != None:
+                parser.feed(chunk)
+            else:
+                bBuf += chunk
+                if bRoot == None:
+                    m = re_root.search(bBuf)
+                    if m == None:
+                        continue
+                    bRoot = m.group()
+                m = re_cells_end.search(bBuf)
+                if m == None:
+                    # Keep enough for an end tag that is split over two chunks
+                    bBuf = bBuf[-TAG_SIZE:]
+                    continue
+                parser = ET.XMLPullParser(events=("start", "end"))
+                parser.feed(bRoot)
+                parser.feed(bBuf[m.end():])
+                bBuf = None
+            for event, el in parser.read_events():
+                if event == "start":
+                    if el.tag == NS_MAIN + "hyperlinks":
+                        parent = el
+                elif el.tag == NS_MAIN + "hyperlink":
+                    sId = el.get(NS_REL + "id")
+                    sTarget = oSheetRels[sId][1] if sId in oSheetRels else None
+                    for sCoord in get_range(el.get("ref")):
+                        oLinks[sCoord] = sTarget
+                    if parent != None:
+                        parent.remove(el)
+    return oLinks
+
+def iter_rows(flInput, sSheet, lStrings, min_row=1, max_col=7):
+    """Yield the rows of worksheet [sSheet] of [flInput] from [min_row] on, as they are parsed"""
+
+    with zipfile.ZipFile(flInput) as zf:
+        row = 0
+        iNext = min_row         # Number of the next row to yield
+        sheetData = None
+        with zf.open(sSheet) as f:
+            for event, el in ET.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if el.tag == NS_MAIN + "sheetData":
+                        sheetData = el
+                elif el.tag == NS_MAIN + "row":
+                    row = int(el.get("r", row + 1))
+                    if row >= min_row:
+                        # Rows that are not in the XML are empty
+                        while iNext < row:
+                            yield ()
+                            iNext += 1
+                        lRow = [None] * max_col
+                        col = 0
+                        for c in el.iterfind(NS_MAIN + "c"):
+                            sRef = c.get("r")
+                            col = get_column(re_ref.match(sRef).group(1)) if sRef else col + 1
+                            if col <= max_col:
+                                lRow[col - 1] = get_value(c, lStrings)
+                        # Drop the row from the tree once it is read
+                        sheetData.remove(el)
+                        yield tuple(lRow)
+                        iNext += 1
+                    else:
+                        sheetData.remove(el)
+                elif el.tag == NS_MAIN + "sheetData":
+                    # The rest of the sheet has no cells
+                    return
+
+def read_sheet(flInput, min_row=1, max_col=7):
+    """Read the active worksheet of [flInput]
+
+    Returns a generator of the rows from [min_row] on, as tuples of
+    [max_col] values with empty tuples for rows that are not there, and the
+    targets of the hyperlinks of the sheet as a dictionary keyed by cell
+    coordinate. The links are read first; the rows are only parsed as
+    the generator is consumed.
+    """
+
+    with zipfile.ZipFile(flInput) as zf:
+        sSheet, sShared = get_active_sheet(zf)
+        lStrings = read_shared_strings(zf, sShared)
+        oLinks = read_links(zf, sSheet)
+    return iter_rows(flInput, sSheet, lStrings, min_row, max_col), oLinks
+
+def get_range(sRef):
+    """Return the coordinates of the cells in [sRef]: one cell like "C2", or a range like "C2:D5\""""
+
+    if ":" not in sRef:
+        return [sRef]
+    sFirst, sLast = sRef.split(":")
+    colFirst, rowFirst = re_ref.match(sFirst).groups()
+    colLast, rowLast = re_ref.match(sLast).groups()
+    lCoords = []
+    for row in range(int(rowFirst), int(rowLast) + 1):
+        for col in range(get_column(colFirst), get_column(colLast) + 1):
+            lCoords.append("{}{}".format(get_letters(col), row))
+    return lCoords
+
+def get_letters(col):
+    sLetters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        sLetters = chr(65 + rem) + sLetters
+    return sLetters
@@ -0,0 +1,142 @@
+"""Write an Excel workbook from separately generated worksheet parts
+
+Each worksheet is written as a stand-alone XML part, using inline strings
+so that no shared string table is needed. The parts can therefore be made
+by separate processes. The workbook is assembled afterwards, by packing
+the parts into one .xlsx together with a fixed set of styles:
+
+    0   default
+    1   bsco_header (bold)
+    2   bsco_cell   (default alignment: no text wrapping)
+
+"""
+import io
+import re
+import shutil
+import zipfile
+
+# Style indices in the cellXfs of STYLES
+STYLE_DEFAULT = 0
+STYLE_HEADER = 1
+STYLE_CELL = 2
+
+# Characters that are not allowed in XML (the same as openpyxl refuses)
+re_illegal = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
+
+INFINITY = float("inf")
+
+# Characters that must be escaped in XML text (and in attributes: the double quote)
+XML_ESCAPES = {ord("&"): "&amp;", ord("<"): "&lt;", ord(">"): "&gt;"}
+XML_ATTR_ESCAPES = dict(XML_ESCAPES)
+XML_ATTR_ESCAPES[ord('"')] = "&quot;"
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="{0}">
+<fonts count="2"><font><name val="Calibri"/><family val="2"/><color theme="1"/><sz val="11"/><scheme val="minor"/></font><font><b val="1"/></font></fonts>
+<fills count="2"><fill><patternFill/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/><xf numFmtId="0" fontId="1" fillId="0" borderId="0"/><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/><xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="1" applyFont="1"/><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="2" applyAlignment="1"><alignment/></xf></cellXfs>
+<cellStyles count="3"><cellStyle name="Normal" xfId="0" builtinId="0"/><cellStyle name="bsco_header" xfId="1"/><cellStyle name="bsco_cell" xfId="2"/></cellStyles>
+</styleSheet>""".format(NS_MAIN)
+
+
+def escape(sText, oEscapes=XML_ESCAPES):
+    """Escape [sText] for XML, like xml.sax.saxutils.escape() (which loads slowly)"""
+
+    return sText.translate(oEscapes)
+
+def get_cell(sRef, value, iStyle):
+    """Return the XML of one cell"""
+
+    if value is None or value == "":
+        return '<c r="{}" s="{}"/>'.format(sRef, iStyle)
+    tValue = type(value)
+    if tValue is str:
+        if re_illegal.search(value):
+            raise ValueError("Illegal character in cell {}".format(sRef))
+        sSpace = ' xml:space="preserve"' if value != value.strip() else ''
+        return '<c r="{}" s="{}" t="inlineStr"><is><t{}>{}</t></is></c>'.format(sRef, iStyle, sSpace, escape(value))
+    elif tValue is bool:
+        return '<c r="{}" s="{}" t="b"><v>{}</v></c>'.format(sRef, iStyle, int(value))
+    elif tValue is int or tValue is float:
+        if value != value or value in (INFINITY, -INFINITY):
+            # Excel has no NaN or infinity: openpyxl leaves the number out
+            return '<c r="{}" s="{}" t="n"><v></v></c>'.format(sRef, iStyle)
+        # The same 16 significant digits as openpyxl
+        return '<c r="{}" s="{}" t="n"><v>{}</v></c>'.format(sRef, iStyle, "%.16g" % value)
+    raise ValueError("Cannot convert {!r} to Excel".format(value))
+
+def write_part(flPart, lNames, lRows, bPlain=False):
+    """Write the worksheet part [flPart] with header [lNames] and the value tuples [lRows]
+
+    A value of None in a row leaves its cell out. Returns the number of data rows.
+    """
+
+    from openpyxl.utils.cell import get_column_letter
+
+    lLetters = [get_column_letter(col_num) for col_num in range(1, len(lNames) + 1)]
+    iCell = STYLE_DEFAULT if bPlain else STYLE_CELL
+    iRows = 0
+    with io.open(flPart, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n')
+        f.write('<worksheet xmlns="{}" xmlns:r="{}">'.format(NS_MAIN, NS_REL))
+        if len(lNames) > 0:
+            f.write('<cols><col min="1" max="{}" width="20" customWidth="1"/></cols>'.format(len(lNames)))
+        f.write('<sheetData>')
+        # The header row
+        f.write('<row r="1">')
+        for sLetter, sName in zip(lLetters, lNames):
+            f.write(get_cell(sLetter + "1", sName, STYLE_HEADER))
+        f.write('</row>')
+        # The data rows
+        for tRow in lRows:
+            iRows += 1
+            sRow = str(iRows + 1)
+            lCells = ['<row r="{}">'.format(sRow)]
+            for sLetter, value in zip(lLetters, tRow):
+                if value is not None:
+                    lCells.append(get_cell(sLetter + sRow, value, iCell))
+            lCells.append('</row>')
+            f.write("".join(lCells))
+        f.write('</sheetData></worksheet>')
+    return iRows
+
+def assemble(flOutput, lSheets):
+    """Pack the parts in [lSheets], a list of (title, part file name), into workbook [flOutput]"""
+
+    lOverride = []
+    lSheetXml = []
+    lRelXml = []
+    for idx, (sTitle, flPart) in enumerate(lSheets, 1):
+        lOverride.append('<Override PartName="/xl/worksheets/sheet{}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'.format(idx))
+        lSheetXml.append('<sheet name="{}" sheetId="{}" r:id="rId{}"/>'.format(escape(sTitle, XML_ATTR_ESCAPES), idx, idx))
+        lRelXml.append('<Relationship Id="rId{0}" Type="{1}/worksheet" Target="worksheets/sheet{0}.xml"/>'.format(idx, NS_REL))
+    iStyles = len(lSheets) + 1
+    lRelXml.append('<Relationship Id="rId{}" Type="{}/styles" Target="styles.xml"/>'.format(iStyles, NS_REL))
+
+    sHead = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    sTypes = sHead + ('<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        + "".join(lOverride) + '</Types>')
+    sRels = sHead + ('<Relationships xmlns="{}"><Relationship Id="rId1" Type="{}/officeDocument" Target="xl/workbook.xml"/></Relationships>'.format(NS_PKG, NS_REL))
+    sWorkbook = sHead + ('<workbook xmlns="{}" xmlns:r="{}"><sheets>{}</sheets></workbook>'.format(NS_MAIN, NS_REL, "".join(lSheetXml)))
+    sWorkbookRels = sHead + '<Relationships xmlns="{}">{}</Relationships>'.format(NS_PKG, "".join(lRelXml))
+
+    with zipfile.ZipFile(flOutput, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", sTypes)
+        zf.writestr("_rels/.rels", sRels)
+        zf.writestr("xl/workbook.xml", sWorkbook)
+        zf.writestr("xl/_rels/workbook.xml.rels", sWorkbookRels)
+        zf.writestr("xl/styles.xml", STYLES)
+        for idx, (sTitle, flPart) in enumerate(lSheets, 1):
+            # Copy the part without holding it in memory
+            with io.open(flPart, "rb") as fIn, zf.open("xl/worksheets/sheet{}.xml".format(idx), "w") as fOut:
+                shutil.copyfileobj(fIn, fOut, 1 << 20)